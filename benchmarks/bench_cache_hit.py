@@ -0,0 +1,82 @@
+"""
+Measures cache hits per second of `decorators.cache`, and how many keys per
+second the compiled key builder and `functools._make_key` build for the same
+calls.
+
+Usage example:
+`python benchmarks/bench_cache_hit.py --calls 100000`
+"""
+
+import argparse
+import asyncio
+import functools
+import time
+from typing import Any, Callable
+
+from pgcachewatch import decorators, listeners, strategies
+
+
+class HealthyEventQueue(listeners.EventQueue):
+    def connection_healthy(self) -> bool:
+        return True
+
+
+async def one(user_id: int) -> int:
+    return user_id
+
+
+async def several(user_id: int, limit: int = 10, *, active: bool = True) -> int:
+    return user_id
+
+
+def best(repeat: int, run: Callable[[], Any]) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parsed = parser.parse_args()
+    calls = range(parsed.calls)
+
+    for fn, args, kwargs in (
+        (one, (1,), {}),
+        (several, (1,), {"active": True}),
+    ):
+        build_key = decorators._key_builder(fn, None)
+        compiled = best(
+            parsed.repeat, lambda: [build_key(*args, **kwargs) for _ in calls]
+        )
+        make_key = best(
+            parsed.repeat,
+            lambda: [functools._make_key(args, kwargs, False) for _ in calls],
+        )
+
+        cached = decorators.cache(
+            strategy=strategies.Greedy(listener=HealthyEventQueue()),
+        )(fn)
+
+        async def hits() -> None:
+            for _ in calls:
+                await cached(*args, **kwargs)
+
+        async def miss() -> None:
+            await cached(*args, **kwargs)
+
+        asyncio.run(miss())
+        hit = best(parsed.repeat, lambda: asyncio.run(hits()))
+
+        name = fn.__name__
+        print(f"{name}: compiled keys {parsed.calls / compiled:,.0f}/second")
+        print(f"{name}: functools keys {parsed.calls / make_key:,.0f}/second")
+        print(f"{name}: cache hits {parsed.calls / hit:,.0f}/second")
+
+
+if __name__ == "__main__":
+    main()
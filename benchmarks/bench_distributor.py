@@ -0,0 +1,161 @@
+"""
+Load test of `pg_event_distributor`, measuring how many events per second are
+delivered to WebSocket subscribers for an increasing number of worker
+processes, and how that scales relative to the first number of workers.
+Requires a PostgreSQL server reachable with the PG* environment variables,
+and more CPUs than workers, as the subscribing clients need CPUs too.
+
+Usage example:
+`python benchmarks/bench_distributor.py --workers 1 2 4 --subscribers 2000`
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import multiprocessing.synchronize
+import os
+import subprocess
+import sys
+import time
+
+import asyncpg
+import httpx
+import websockets
+
+CHANNEL = "bench_distributor"
+
+
+async def wait_until_up(address: str, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=f"http://{address}") as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/up")).is_success:
+                    return
+            except httpx.ConnectError:
+                pass
+            await asyncio.sleep(0.05)
+    raise RuntimeError("Distributor did not come up")
+
+
+async def subscribe(
+    address: str,
+    subscribers: int,
+    events: int,
+    ready: multiprocessing.synchronize.Barrier,
+) -> float:
+    url = f"ws://{address}/pgpubsub/{CHANNEL}"
+    connections = [await websockets.connect(url) for _ in range(subscribers)]
+
+    async def receive(ws: websockets.ClientConnection) -> None:
+        received = 0
+        while received < events:
+            await ws.recv()
+            received += 1
+
+    ready.wait()
+    await asyncio.gather(*(receive(ws) for ws in connections))
+    finished = time.monotonic()
+    await asyncio.gather(*(ws.close() for ws in connections))
+    return finished
+
+
+def client(
+    address: str,
+    subscribers: int,
+    events: int,
+    ready: multiprocessing.synchronize.Barrier,
+    results: multiprocessing.Queue,
+) -> None:
+    results.put(asyncio.run(subscribe(address, subscribers, events, ready)))
+
+
+async def emit(events: int) -> float:
+    payload = json.dumps(
+        {
+            "operation": "update",
+            "table": "placeholder",
+            "sent_at": datetime.datetime.now(tz=datetime.timezone.utc).isoformat(),
+        }
+    )
+    conn = await asyncpg.connect()
+    try:
+        start = time.monotonic()
+        for _ in range(events):
+            await conn.execute("SELECT pg_notify($1, $2)", CHANNEL, payload)
+        return start
+    finally:
+        await conn.close()
+
+
+def run(workers: int, subscribers: int, events: int, clients: int, port: int) -> float:
+    address = f"127.0.0.1:{port}"
+    command = [
+        sys.executable,
+        "-m",
+        "pgcachewatch.pg_event_distributor",
+        f"--workers={workers}",
+        f"--port={port}",
+    ]
+    with subprocess.Popen(command, stderr=subprocess.DEVNULL) as server:
+        try:
+            asyncio.run(wait_until_up(address))
+
+            context = multiprocessing.get_context("spawn")
+            ready = context.Barrier(clients + 1)
+            results = context.Queue()
+            processes = [
+                context.Process(
+                    target=client,
+                    args=(address, subscribers // clients, events, ready, results),
+                )
+                for _ in range(clients)
+            ]
+            for process in processes:
+                process.start()
+
+            ready.wait()
+            # Let every subscription reach its worker before the first event.
+            time.sleep(1)
+            start = asyncio.run(emit(events))
+            finished = max(results.get() for _ in processes)
+            for process in processes:
+                process.join()
+        finally:
+            server.terminate()
+
+    return (subscribers // clients) * clients * events / (finished - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--subscribers", type=int, default=1_000)
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--port", type=int, default=8100)
+    parsed = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {parsed.clients} client processes")
+    baseline = None
+    for workers in parsed.workers:
+        rate = run(
+            workers,
+            parsed.subscribers,
+            parsed.events,
+            parsed.clients,
+            parsed.port,
+        )
+        baseline = baseline or (rate, workers)
+        scaling = rate / baseline[0]
+        ideal = workers / baseline[1]
+        print(
+            f"{workers} workers: {rate:,.0f} deliveries/second, "
+            f"{scaling:.2f}x the first ({ideal:.2f}x would be linear)"
+        )
+
+
+if __name__ == "__main__":
+    main()
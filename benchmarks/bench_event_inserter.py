@@ -0,0 +1,65 @@
+"""
+Measures how many NOTIFY payloads per second `listeners.create_event_inserter`
+parses and enqueues.
+
+Usage example:
+`python benchmarks/bench_event_inserter.py --events 100000 [--compact]`
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import time
+
+from pgcachewatch import listeners, models
+
+
+def payloads(events: int, compact: bool) -> list[str]:
+    sent_at = datetime.datetime.now(tz=datetime.timezone.utc)
+    if compact:
+        micros = int(sent_at.timestamp() * 1_000_000)
+        return [
+            json.dumps({"o": "u", "t": "placeholder", "s": micros})
+            for _ in range(events)
+        ]
+    return [
+        json.dumps(
+            {
+                "operation": "update",
+                "table": "placeholder",
+                "sent_at": sent_at.isoformat(),
+            }
+        )
+        for _ in range(events)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--compact", action="store_true")
+    parsed = parser.parse_args()
+
+    channel = models.PGChannel("bench_event_inserter")
+    data = payloads(parsed.events, parsed.compact)
+    best = float("inf")
+
+    for _ in range(parsed.repeat):
+        queue = asyncio.Queue[models.Event]()
+        inserter = listeners.create_event_inserter(
+            queue,
+            max_latency=datetime.timedelta(days=1),
+        )
+        start = time.perf_counter()
+        for payload in data:
+            inserter(channel, payload)
+        best = min(best, time.perf_counter() - start)
+        assert queue.qsize() == parsed.events
+
+    print(f"{parsed.events / best:,.0f} events/second")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Measures cache hits per second of `decorators.sync_cache` called from an
+increasing number of threads, with one shard and with the default sharding.
+Throughput only scales with threads on free-threaded Python builds, such as
+CPython 3.13t, with the GIL the numbers show the cost of locking.
+
+Usage example:
+`python3.13t benchmarks/bench_sync_cache.py --threads 1 2 4 8`
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import sys
+import threading
+import time
+
+from pgcachewatch import decorators, listeners, strategies
+
+
+class HealthyEventQueue(listeners.EventQueue):
+    def connection_healthy(self) -> bool:
+        return True
+
+
+async def run(threads: int, shards: int, calls: int, keys: int, bounded: bool) -> float:
+    # Decorated on the event loop the listener belongs to.
+    @decorators.sync_cache(
+        strategy=strategies.Greedy(listener=HealthyEventQueue()),
+        max_entries=keys if bounded else None,
+        shards=shards,
+    )
+    def square(n: int) -> int:
+        return n * n
+
+    for n in range(keys):
+        square(n)
+
+    barrier = threading.Barrier(threads + 1)
+
+    def hits(offset: int) -> None:
+        barrier.wait()
+        for n in range(calls):
+            square((n + offset) % keys)
+
+    def measure() -> float:
+        with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+            futures = [pool.submit(hits, offset) for offset in range(threads)]
+            barrier.wait()
+            start = time.perf_counter()
+            for future in futures:
+                future.result()
+            return threads * calls / (time.perf_counter() - start)
+
+    return await asyncio.to_thread(measure)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--keys", type=int, default=1_024)
+    parser.add_argument("--bounded", action="store_true")
+    parsed = parser.parse_args()
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"GIL {'enabled' if gil else 'disabled'}")
+    for shards in parsed.shards:
+        for threads in parsed.threads:
+            rate = asyncio.run(
+                run(threads, shards, parsed.calls, parsed.keys, parsed.bounded)
+            )
+            print(f"{shards} shards, {threads} threads: {rate:,.0f} hits/second")
+
+
+if __name__ == "__main__":
+    main()
@@ -109,6 +109,50 @@ def cliparser() -> argparse.Namespace:
         parents=[common_arguments],
     )
     install.add_argument("tables", nargs=argparse.ONE_OR_MORE)
+    mode = install.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--row-level",
+        action="store_true",
+        help=(
+            "Install row-level triggers that include the key columns of every "
+            "changed row in the emitted events."
+        ),
+    )
+    mode.add_argument(
+        "--batched",
+        action="store_true",
+        help=(
+            "Install statement-level triggers using transition tables, emitting "
+            "the key columns of all changed rows in as few events as possible."
+        ),
+    )
+    install.add_argument(
+        "--key-columns",
+        nargs=argparse.ONE_OR_MORE,
+        default=None,
+        help=(
+            "Columns emitted per changed row in row-level and batched mode. "
+            "Defaults to the primary key of each table."
+        ),
+    )
+    install.add_argument(
+        "--compact",
+        action="store_true",
+        help=(
+            "Emit events in a compact format with one letter field names and "
+            "timestamps in epoch microseconds, smaller on the wire and cheaper "
+            "to decode. Requires listeners that understand it."
+        ),
+    )
+    install.add_argument(
+        "--max-keys",
+        type=int,
+        default=1_000,
+        help=(
+            "In batched mode, statements changing more rows than this emit a "
+            "single event without keys, invalidating the whole table."
+        ),
+    )
 
     subparsers.add_parser(
         "uninstall",
@@ -119,6 +163,60 @@ def cliparser() -> argparse.Namespace:
     return parser.parse_args()
 
 
+async def create_trigger(
+    pool: asyncpg.Pool,
+    parsed: argparse.Namespace,
+    table: str,
+    trigger_name: str,
+    function_name: str,
+) -> str:
+    if not parsed.row_level and not parsed.batched:
+        return queries.create_after_change_trigger(
+            trigger_name=trigger_name,
+            table_name=table,
+            function_name=function_name,
+        )
+
+    key_columns = parsed.key_columns or [
+        r["column_name"]
+        for r in await pool.fetch(queries.fetch_primary_key_columns(), table)
+    ]
+    if not key_columns:
+        sys.exit(f"Table '{table}' has no primary key, use '--key-columns'.")
+
+    return (
+        queries.create_after_change_row_trigger
+        if parsed.row_level
+        else queries.create_after_change_batched_trigger
+    )(
+        trigger_name=trigger_name,
+        table_name=table,
+        function_name=function_name,
+        key_columns=key_columns,
+    )
+
+
+def create_function(parsed: argparse.Namespace, function_name: str) -> str:
+    if parsed.row_level:
+        return queries.create_row_notify_function(
+            channel_name=parsed.channel_name,
+            function_name=function_name,
+            compact=parsed.compact,
+        )
+    if parsed.batched:
+        return queries.create_batched_notify_function(
+            channel_name=parsed.channel_name,
+            function_name=function_name,
+            max_keys=parsed.max_keys,
+            compact=parsed.compact,
+        )
+    return queries.create_notify_function(
+        channel_name=parsed.channel_name,
+        function_name=function_name,
+        compact=parsed.compact,
+    )
+
+
 async def main() -> None:
     parsed = cliparser()
 
@@ -138,17 +236,10 @@ async def main() -> None:
         match parsed.command:
             case "install":
                 install = "\n".join(
-                    [
-                        queries.create_notify_function(
-                            channel_name=parsed.channel_name,
-                            function_name=pg_fn_name,
-                        )
-                    ]
+                    [create_function(parsed, pg_fn_name)]
                     + [
-                        queries.create_after_change_trigger(
-                            trigger_name=pg_tg_name,
-                            table_name=table,
-                            function_name=pg_fn_name,
+                        await create_trigger(
+                            pool, parsed, table, pg_tg_name, pg_fn_name
                         )
                         for table in parsed.tables
                     ]
@@ -1,19 +1,617 @@
 import asyncio
+import collections.abc
+import concurrent.futures
+import datetime
+import functools
+import inspect
+import sys
+import threading
+import time
+import weakref
 from functools import _make_key as make_key
-from typing import Awaitable, Callable, Hashable, Literal, TypeVar
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Collection,
+    Generic,
+    Hashable,
+    Iterable,
+    Literal,
+    NoReturn,
+    TypeVar,
+)
 
 from typing_extensions import ParamSpec
 
-from pgcachewatch import strategies
+from pgcachewatch import eviction, serialization, storage, strategies
 from pgcachewatch.logconfig import logger
 
 P = ParamSpec("P")
 T = TypeVar("T")
+W = TypeVar("W", bound="asyncio.Future[Any] | concurrent.futures.Future[Any]")
+
+Statistic = Literal["hit", "miss", "evict"]
+
+_NO_TAGS = frozenset[strategies.Tag]()
+
+
+def _empty(value: Any) -> bool:
+    return value is None or (
+        isinstance(value, collections.abc.Sized) and len(value) == 0
+    )
+
+
+class _Raised:
+    """
+    An exception raised by a computation, raised again by the calls of its key
+    until it expires.
+    """
+
+    def __init__(self, exception: BaseException, expires: float) -> None:
+        self.exception = exception
+        self.traceback = exception.__traceback__
+        self.expires = expires
+
+    def reraise(self) -> NoReturn:
+        # Restoring the original traceback, as asyncio futures do, keeps it from
+        # growing with every raise.
+        raise self.exception.with_traceback(self.traceback)
+
+
+class _TagIndex:
+    """
+    Reverse index from tags to the cache keys that depend on them.
+
+    A tag matches every tag it is a prefix of and every tag that is a prefix of
+    it, so an event tagged `("users",)` matches entries tagged `("users", 1)` and
+    an event tagged `("users", 1)` matches entries tagged `("users",)`.
+    """
+
+    def __init__(self) -> None:
+        self._tags = dict[Hashable, tuple[strategies.Tag, ...]]()
+        self._exact = dict[strategies.Tag, set[Hashable]]()
+        self._below = dict[strategies.Tag, set[Hashable]]()
+
+    def add(self, key: Hashable, tags: Iterable[strategies.Tag]) -> None:
+        self.discard(key)
+        self._tags[key] = tuple(tags)
+        for tag in self._tags[key]:
+            self._exact.setdefault(tag, set()).add(key)
+            for n in range(1, len(tag) + 1):
+                self._below.setdefault(tag[:n], set()).add(key)
+
+    def discard(self, key: Hashable) -> None:
+        for tag in self._tags.pop(key, ()):
+            self._remove(self._exact, tag, key)
+            for n in range(1, len(tag) + 1):
+                self._remove(self._below, tag[:n], key)
+
+    def match(self, tags: Iterable[strategies.Tag]) -> set[Hashable]:
+        keys = set[Hashable]()
+        for tag in tags:
+            keys.update(self._below.get(tag, ()))
+            for n in range(1, len(tag)):
+                keys.update(self._exact.get(tag[:n], ()))
+        return keys
+
+    def clear(self) -> None:
+        self._tags.clear()
+        self._exact.clear()
+        self._below.clear()
+
+    @staticmethod
+    def _remove(
+        index: dict[strategies.Tag, set[Hashable]],
+        tag: strategies.Tag,
+        key: Hashable,
+    ) -> None:
+        if (keys := index.get(tag)) is not None:
+            keys.discard(key)
+            if not keys:
+                del index[tag]
+
+
+class _Entries(Generic[T]):
+    """
+    The entries of one cached function, with the bookkeeping needed to
+    invalidate them selectively and to keep them within their bounds.
+    """
+
+    def __init__(
+        self,
+        tagged: bool,
+        max_entries: int | None,
+        max_bytes: int | None,
+        policy: Callable[[], eviction.EvictionPolicy],
+        sizeof: Callable[[T], int],
+        statistics_callback: Callable[[Statistic], None],
+        ttl: datetime.timedelta | None,
+        stale_while_revalidate: datetime.timedelta | None,
+        store: storage.Storage[Any],
+        codec: serialization.Codec[T] | None,
+        negative_ttl: datetime.timedelta | None,
+        is_negative: Callable[[T], bool],
+    ) -> None:
+        if store.shared and (
+            tagged
+            or max_entries
+            or max_bytes
+            or ttl
+            or stale_while_revalidate
+            or negative_ttl
+        ):
+            raise ValueError(
+                "tags, max_entries, max_bytes, ttl, stale_while_revalidate and "
+                "negative_ttl require a process local storage"
+            )
+        if ttl is None and stale_while_revalidate is not None:
+            raise ValueError("stale_while_revalidate requires a ttl")
+        if max_entries is not None and max_entries <= 0:
+            raise ValueError("max_entries must be greater than zero")
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError("max_bytes must be greater than zero")
+
+        # Computations in flight, awaited by async callers and waited for by
+        # threads of a synchronous cache.
+        self.futures = dict[
+            Hashable, asyncio.Future[T] | concurrent.futures.Future[T]
+        ]()
+        self.storage = store
+        # Generations of the shared storage computations started in, their
+        # values are dropped if another process cleared it since.
+        self.generations = dict[Hashable, int]()
+        self.codec = (
+            serialization.RecordCodec() if codec is None and store.shared else codec
+        )
+        self.index = _TagIndex() if tagged else None
+        self.policy = None if max_entries is None and max_bytes is None else policy()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.sizes = dict[Hashable, int]()
+        self.nbytes = 0
+        self.statistics_callback = statistics_callback
+        self.ttl = None if ttl is None else ttl.total_seconds()
+        self.stale = (
+            0.0
+            if stale_while_revalidate is None
+            else stale_while_revalidate.total_seconds()
+        )
+        self.expires = dict[Hashable, float]()
+        self.negative_ttl = (
+            None if negative_ttl is None else negative_ttl.total_seconds()
+        )
+        self.is_negative = is_negative
+        # Cached exceptions, in the order they expire as all live negative_ttl.
+        self.errors = dict[Hashable, _Raised]()
+        self.refreshing = dict[Hashable, asyncio.Task[None]]()
+        self.watcher: asyncio.Task[None] | None = None
+
+    def get(self, key: Hashable) -> T:
+        """
+        Returns the computed value of key.
+
+        Raises:
+            KeyError: If key has no value, or its value expired.
+        """
+        if self.policy is not None:
+            self.policy.access(key)
+
+        try:
+            return self.peek(key)
+        except KeyError:
+            if key in self.expires:
+                logger.debug("Cache expired")
+                self.pop(key)
+            raise
+
+    def peek(self, key: Hashable) -> T:
+        """
+        Returns the computed value of key like `get`, but neither records the
+        access nor drops an expired value, so it only reads the entries.
+
+        Raises:
+            KeyError: If key has no value, or its value expired.
+        """
+        value = self.storage.get(key)
+        if (
+            expires := self.expires.get(key)
+        ) is not None and time.monotonic() >= expires + self.stale:
+            raise KeyError(key)
+        return value if self.codec is None else self.codec.loads(value)
+
+    def expired(self, key: Hashable) -> bool:
+        """
+        True if the entry is past its ttl, but still within the window where it
+        may be served while a refresh is running, and no refresh is running.
+        """
+        return (
+            self.stale > 0
+            and key not in self.refreshing
+            and (expires := self.expires.get(key)) is not None
+            and time.monotonic() >= expires
+        )
+
+    def revalidate(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> None:
+        """
+        Recomputes an expired entry in a background task, replacing it unless it
+        was invalidated in the meantime. Failures keep the stale entry.
+        """
+
+        async def refresh() -> None:
+            try:
+                value = await compute()
+            except Exception:
+                logger.exception("Cache refresh failed.")
+                return
+            finally:
+                # Invalidating the key drops the refresh, its value is stale.
+                current = self.refreshing.get(key) is asyncio.current_task()
+                if current:
+                    del self.refreshing[key]
+
+            if not current:
+                return
+
+            size = self.store(key, value)
+            lifetime = self.lifetime(value)
+            assert lifetime is not None
+            self.expires[key] = time.monotonic() + lifetime
+
+            if self.max_bytes is not None:
+                self.nbytes += size - self.sizes.get(key, 0)
+                self.sizes[key] = size
+                self._shrink()
+
+        logger.debug("Cache refresh")
+        self.refreshing[key] = asyncio.create_task(refresh())
+
+    def pending(
+        self,
+        key: Hashable,
+        tags: Iterable[strategies.Tag] | None,
+        waiter: W,
+    ) -> W:
+        self.futures[key] = waiter
+        if self.storage.shared:
+            self.generations[key] = self.storage.generation()
+        if self.index is not None and tags is not None:
+            self.index.add(key, tags)
+        return waiter
+
+    def admit(self, key: Hashable, waiter: object, value: T) -> None:
+        """
+        Stores a computed entry, evicting others as needed to stay within
+        bounds. The entry itself is dropped if it can not or should not fit,
+        or if it was invalidated while being computed.
+        """
+        if self.futures.get(key) is not waiter:
+            return
+
+        del self.futures[key]
+        try:
+            size = self.store(key, value, self.generations.pop(key, None))
+        except Exception:
+            # Such as a value the codec can not encode, or a full disk. The
+            # callers have their value, it is just not cached.
+            logger.exception("Failed to store cache entry.")
+            self.pop(key)
+            return
+
+        if (lifetime := self.lifetime(value)) is not None:
+            self.expires[key] = time.monotonic() + lifetime
+
+        if self.policy is None:
+            return
+
+        if self.max_bytes is not None and size > self.max_bytes:
+            self.pop(key)
+            return
+
+        while self._exceeds(size):
+            victim = self.policy.victim()
+            if not self.policy.admit(key, victim):
+                self.pop(key)
+                return
+            logger.debug("Cache evict")
+            self.statistics_callback("evict")
+            self.pop(victim)
+
+        self.policy.insert(key)
+        self.sizes[key] = size
+        self.nbytes += size
+
+    def store(self, key: Hashable, value: T, generation: int | None = None) -> int:
+        """
+        Stores value, encoded if there is a codec, and returns its size in
+        bytes. Without a codec the size is only measured for byte bounds.
+        """
+        if self.codec is None:
+            self.storage.set(key, value, generation)
+            return 0 if self.max_bytes is None else self.sizeof(value)
+
+        data = self.codec.dumps(value)
+        self.storage.set(key, data, generation)
+        return len(data)
+
+    def lifetime(self, value: T) -> float | None:
+        """
+        Seconds value is served for, at most negative_ttl if it is negative.
+        """
+        if self.negative_ttl is None or not self.is_negative(value):
+            return self.ttl
+        if self.ttl is None:
+            return self.negative_ttl
+        return min(self.ttl, self.negative_ttl)
+
+    def settle(self, key: Hashable, computation: asyncio.Future[T]) -> None:
+        """
+        Stores the outcome of a computation once it is done. A failed or
+        cancelled one is forgotten, its callers get the exception.
+        """
+        if computation.cancelled():
+            self.fail(key, computation)
+        elif (exception := computation.exception()) is not None:
+            self.fail(key, computation, exception)
+        else:
+            self.admit(key, computation, computation.result())
+
+    def fail(
+        self,
+        key: Hashable,
+        waiter: object,
+        exception: BaseException | None = None,
+    ) -> None:
+        """
+        Forgets a computation that failed, so the next call retries it. With a
+        negative_ttl, the exception is raised again by calls until then.
+        """
+        if self.futures.get(key) is not waiter:
+            return
+
+        del self.futures[key]
+        self.generations.pop(key, None)
+        if self.negative_ttl is None or not isinstance(exception, Exception):
+            if self.index is not None:
+                self.index.discard(key)
+            return
+
+        now = time.monotonic()
+        while self.errors:
+            oldest = next(iter(self.errors))
+            if self.errors[oldest].expires > now:
+                break
+            del self.errors[oldest]
+        self.errors[key] = _Raised(exception, now + self.negative_ttl)
+
+    def raised(self, key: Hashable) -> _Raised | None:
+        """
+        Returns the cached exception of key, unless it has none or it expired.
+        """
+        if (raised := self.errors.get(key)) is None:
+            return None
+        if time.monotonic() >= raised.expires:
+            self.errors.pop(key, None)
+            return None
+        return raised
+
+    def pop(self, key: Hashable) -> None:
+        self.futures.pop(key, None)
+        self.generations.pop(key, None)
+        self.errors.pop(key, None)
+        self.storage.delete(key)
+        self.refreshing.pop(key, None)
+        self.expires.pop(key, None)
+        if self.index is not None:
+            self.index.discard(key)
+        if self.policy is not None:
+            self.policy.remove(key)
+            self.nbytes -= self.sizes.pop(key, 0)
+
+    def clear(self) -> None:
+        self.futures.clear()
+        self.generations.clear()
+        self.errors.clear()
+        self.storage.clear()
+        self.refreshing.clear()
+        self.expires.clear()
+        if self.index is not None:
+            self.index.clear()
+        if self.policy is not None:
+            self.policy.clear()
+            self.sizes.clear()
+            self.nbytes = 0
+
+    def invalidate(
+        self,
+        strategy: strategies.Strategy,
+        targeted: strategies.TargetedStrategy | None,
+    ) -> None:
+        """
+        Applies pending invalidations from the strategy.
+        """
+        self.apply(
+            strategy.clear(),
+            _NO_TAGS if targeted is None else targeted.affected(),
+        )
+
+    def apply(self, clear: bool, affected: Collection[strategies.Tag]) -> None:
+        """
+        Applies invalidations polled from a strategy. Without a tag index, any
+        affected tag reported by a targeted strategy clears everything.
+        """
+        if clear:
+            logger.debug("Cache clear")
+            self.clear()
+
+        if not affected:
+            return
+
+        if self.index is None:
+            logger.debug("Cache clear")
+            self.clear()
+            return
+
+        for key in self.index.match(affected):
+            logger.debug("Cache evict")
+            self.pop(key)
+
+    def watch(
+        self,
+        strategy: strategies.Strategy,
+        targeted: strategies.TargetedStrategy | None,
+    ) -> None:
+        """
+        Ensures a background task applies invalidations as events arrive,
+        restarting it if it died.
+        """
+        if self.watcher is not None and not self.watcher.done():
+            return
+
+        if self.watcher is not None and not self.watcher.cancelled():
+            logger.error(
+                "Cache invalidation task stopped, restarting.",
+                exc_info=self.watcher.exception(),
+            )
+
+        async def watcher() -> None:
+            while True:
+                await strategy.wait()
+                self.invalidate(strategy, targeted)
+                # A strategy that consumed no events returns from wait at once,
+                # yielding keeps that from starving the loop.
+                await asyncio.sleep(0)
+
+        self.invalidate(strategy, targeted)
+        self.watcher = asyncio.create_task(watcher())
+
+    def close(self) -> None:
+        """
+        Cancels the background task, once the cached function is gone. May be
+        called from any thread, as by the garbage collector.
+        """
+        if self.watcher is None or self.watcher.get_loop().is_closed():
+            return
+        self.watcher.get_loop().call_soon_threadsafe(self.watcher.cancel)
+
+    def _shrink(self) -> None:
+        assert self.policy is not None and self.max_bytes is not None
+        while self.nbytes > self.max_bytes:
+            logger.debug("Cache evict")
+            self.statistics_callback("evict")
+            self.pop(self.policy.victim())
+
+    def _exceeds(self, size: int) -> bool:
+        assert self.policy is not None
+        return (
+            self.max_entries is not None and len(self.policy) >= self.max_entries
+        ) or (self.max_bytes is not None and self.nbytes + size > self.max_bytes)
+
+
+class _Expression(str):
+    def __repr__(self) -> str:
+        return self
+
+
+def _kwargs_key(kwargs: dict[str, Any]) -> tuple[tuple[str, Any], ...]:
+    return tuple(sorted(kwargs.items()))
+
+
+def _hashable_default(default: Any) -> Hashable:
+    try:
+        hash(default)
+    except TypeError:
+        # Distinct from any argument, and equal to itself in every call.
+        return object()
+    return default
+
+
+def _key_builder(
+    fn: Callable[..., Any],
+    key: Callable[..., Hashable] | Iterable[str] | None,
+) -> Callable[..., Hashable]:
+    """
+    Compiles the function building the cache keys of fn, once per decorated
+    function.
+
+    The builder takes the same parameters as fn, so Python itself binds the
+    arguments of a call: `f(1)`, `f(user_id=1)` and, if 1 is the default,
+    `f()` share one key. The key holds the bound values in parameter order,
+    only those named by `key` if it is a parameter name or a list of them, and
+    is the bare value for a single one. Omitted parameters with unhashable defaults,
+    such as lists, are keyed by a placeholder instead of their default. A
+    callable `key` is used as it is.
+
+    Raises:
+        ValueError: If `key` names a parameter fn does not have.
+    """
+    if callable(key):
+        return key
+
+    try:
+        parameters = inspect.signature(fn).parameters
+    except (TypeError, ValueError):
+        # No signature to compile, such as for some builtins.
+        return lambda *args, **kwargs: make_key(args, kwargs, typed=False)
+
+    if key is None:
+        names = list(parameters)
+    else:
+        # A string is one parameter name, not a list of one-letter names.
+        names = [key] if isinstance(key, str) else list(key)
+    if unknown := set(names) - set(parameters):
+        raise ValueError(f"{fn.__qualname__} has no parameters {sorted(unknown)}")
+
+    # The helpers the builder refers to are named apart from its parameters,
+    # which would shadow them.
+    prefix = "_key_"
+    while any(name.startswith(prefix) for name in parameters):
+        prefix += "_"
+
+    # Rendered with defaults referring to the namespace the builder is
+    # compiled in, Python checks and binds calls exactly as for fn.
+    namespace: dict[str, Any] = {f"{prefix}kwargs": _kwargs_key}
+    renamed = list[inspect.Parameter]()
+    for parameter in parameters.values():
+        if parameter.default is not inspect.Parameter.empty:
+            name = f"{prefix}default_{len(namespace)}"
+            namespace[name] = _hashable_default(parameter.default)
+            parameter = parameter.replace(default=_Expression(name))
+        renamed.append(parameter.replace(annotation=inspect.Parameter.empty))
+    signature = inspect.Signature(renamed)
+
+    values = [
+        f"{prefix}kwargs({name})"
+        if parameters[name].kind == inspect.Parameter.VAR_KEYWORD
+        else name
+        for name in names
+    ]
+    returned = (
+        values[0] if len(values) == 1 else f"({''.join(v + ', ' for v in values)})"
+    )
+
+    exec(f"def {prefix}build{signature}:\n    return {returned}", namespace)
+    return namespace[f"{prefix}build"]
 
 
 def cache(
     strategy: strategies.Strategy,
-    statistics_callback: Callable[[Literal["hit", "miss"]], None] = lambda _: None,
+    statistics_callback: Callable[[Statistic], None] = lambda _: None,
+    tags: Callable[..., Iterable[strategies.Tag]] | None = None,
+    max_entries: int | None = None,
+    max_bytes: int | None = None,
+    policy: Callable[[], eviction.EvictionPolicy] = eviction.LRU,
+    sizeof: Callable[[Any], int] = sys.getsizeof,
+    ttl: datetime.timedelta | None = None,
+    stale_while_revalidate: datetime.timedelta | None = None,
+    background: bool = False,
+    storage: Callable[[], storage.Storage[Any]] = storage.MemoryStorage,
+    codec: serialization.Codec[Any] | None = None,
+    key: Callable[..., Hashable] | Iterable[str] | None = None,
+    timeout: datetime.timedelta | None = None,
+    negative_ttl: datetime.timedelta | None = None,
+    is_negative: Callable[[Any], bool] = _empty,
 ) -> Callable[[Callable[P, Awaitable[T]]], Callable[P, Awaitable[T]]]:
     """
     Decorator for caching asynchronous function calls based on provided
@@ -23,7 +621,7 @@ def cache(
     entries and ensure efficient data retrieval. The cache is keyed by the
     function's arguments, with support for both positional and keyword arguments.
     It provides mechanisms for cache invalidation and supports concurrent access by
-    utilizing asyncio.Future for pending results, effectively preventing cache
+    sharing one task per pending result, effectively preventing cache
     stampedes.
 
     The decorator ensures that:
@@ -33,14 +631,73 @@ def cache(
         strategy, indicating data invalidation needs.
     - Cache entries are created or retrieved based on the unique call
         signature of the decorated function.
-    - Cache hits and misses are logged and can trigger custom actions
-        via the statistics_callback.
+    - Cache hits, misses and evictions are logged and can trigger custom
+        actions via the statistics_callback.
+    - With a `strategies.TargetedStrategy`, only the entries whose `tags`
+        (computed from the call arguments) match the affected tags are
+        evicted. Without `tags`, any affected tag clears the whole cache.
+    - With `max_entries` and/or `max_bytes`, the cache is bounded and the
+        eviction `policy` (a factory of `eviction.EvictionPolicy`) picks the
+        entries to evict. Entry sizes are measured with `sizeof`, which defaults
+        to the shallow `sys.getsizeof` and should be replaced for nested values.
+    - With a `ttl`, entries expire even if no event invalidates them. With
+        `stale_while_revalidate`, entries that expired no longer ago than that
+        are served while a single background task recomputes them.
+    - With `background`, invalidations are applied by a background task as
+        events arrive, instead of by polling the strategy on every call.
+    - Computed values are kept in the `storage` (a factory of
+        `storage.Storage`), by default a dict of the current process. Shared
+        storages such as `storage.SharedMemoryStorage` let processes reuse
+        each other's values, they do not support tags, bounds nor expiry.
+    - With a `codec` (a `serialization.Codec`), values are stored encoded and
+        decoded on every hit. Entry sizes are then the exact encoded sizes
+        rather than `sizeof` estimates. Shared storages default to
+        `serialization.RecordCodec`, which also encodes `asyncpg.Record`s.
+    - Cache keys are built by a function compiled from the signature of the
+        decorated function, calls binding the same values to its parameters
+        share an entry whether arguments are passed by position or keyword.
+        `key` restricts the key to the named parameters, or replaces the
+        builder by a callable taking the function's arguments.
+    - Computations run in tasks of their own, shared by all callers of the
+        same key. Cancelling a caller never cancels the computation, nor
+        leaves the key waiting for a result that never comes. With a
+        `timeout`, callers waiting longer than that raise
+        `asyncio.TimeoutError`, while the computation goes on and is cached
+        for later calls.
+    - With a `negative_ttl`, exceptions raised by the function are cached
+        and raised again by calls for up to that long, instead of every call
+        retrying. Results `is_negative` deems negative, by default None and
+        empty containers, expire as soon. Events invalidate both as usual.
 
     Note: This decorator is intended for use with asynchronous functions.
     """
 
     def outer(fn: Callable[P, Awaitable[T]]) -> Callable[P, Awaitable[T]]:
-        cached = dict[Hashable, asyncio.Future[T]]()
+        entries = _Entries[T](
+            tagged=tags is not None,
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            policy=policy,
+            sizeof=sizeof,
+            statistics_callback=statistics_callback,
+            ttl=ttl,
+            stale_while_revalidate=stale_while_revalidate,
+            store=storage(),
+            codec=codec,
+            negative_ttl=negative_ttl,
+            is_negative=is_negative,
+        )
+        targeted = (
+            strategy if isinstance(strategy, strategies.TargetedStrategy) else None
+        )
+        invalidate = entries.watch if background else entries.invalidate
+        build_key = _key_builder(fn, key)
+        seconds = None if timeout is None else timeout.total_seconds()
+
+        async def wait(computation: asyncio.Future[T]) -> T:
+            # Shielded, cancelling or timing out one caller does not cancel the
+            # computation the others wait for. No timeout waits indefinitely.
+            return await asyncio.wait_for(asyncio.shield(computation), seconds)
 
         async def inner(*args: P.args, **kwargs: P.kwargs) -> T:
             # If db-conn is down, disable cache.
@@ -50,38 +707,345 @@ def cache(
 
             # Clear cache if we have a event from
             # the database the instructs us to clear.
-            if strategy.clear():
-                logger.debug("Cache clear")
-                cached.clear()
+            invalidate(strategy, targeted)
+
+            key = build_key(*args, **kwargs)
 
-            key = make_key(args, kwargs, typed=False)
+            if (waiter := entries.futures.get(key)) is not None:
+                # Cache hit, on a value still being computed.
+                logger.debug("Cache hit")
+                statistics_callback("hit")
+                return await wait(asyncio.wrap_future(waiter))
+
+            if (raised := entries.raised(key)) is not None:
+                # Cache hit, on an exception.
+                logger.debug("Cache hit")
+                statistics_callback("hit")
+                raised.reraise()
 
             try:
-                waiter = cached[key]
+                value = entries.get(key)
             except KeyError:
-                # Cache miss
-                logger.debug("Cache miss")
-                statistics_callback("miss")
+                pass
             else:
                 # Cache hit
                 logger.debug("Cache hit")
                 statistics_callback("hit")
-                return await waiter
+                if entries.expired(key):
+                    entries.revalidate(key, functools.partial(fn, *args, **kwargs))
+                return value
+
+            # Cache miss
+            logger.debug("Cache miss")
+            statistics_callback("miss")
+
+            # The computation is a task of the cache rather than part of the
+            # caller, callers that are cancelled or time out leave it running
+            # for the others. Registering it prevents cache stampedes.
+            key_tags = None if tags is None else tags(*args, **kwargs)
+            task = entries.pending(
+                key, key_tags, asyncio.ensure_future(fn(*args, **kwargs))
+            )
+            task.add_done_callback(functools.partial(entries.settle, key))
+            return await wait(task)
+
+        weakref.finalize(inner, entries.close)
+        return inner
+
+    return outer
+
+
+class _Shards(Generic[T]):
+    """
+    The entries of a cached function called from many threads, split by key
+    hash into shards with a lock each, so threads working on different keys
+    rarely wait for each other.
+
+    Unbounded shards are read without taking any lock, bounded ones take only
+    their own lock to record the access.
+
+    The strategy and its listener belong to an event loop and are not thread
+    safe, so a task on that loop drains the strategy as events arrive into a
+    buffer guarded by a lock. One calling thread at a time applies the buffered
+    invalidations to every shard, others calling meanwhile do not wait for it.
+    """
+
+    def __init__(
+        self,
+        shards: int,
+        entries: Callable[[int], _Entries[T]],
+        strategy: strategies.Strategy,
+        loop: asyncio.AbstractEventLoop,
+    ) -> None:
+        if shards <= 0:
+            raise ValueError("shards must be greater than zero")
+        self.shards = [entries(n) for n in range(shards)]
+        self.locks = [threading.Lock() for _ in range(shards)]
+        self.strategy = strategy
+        self.targeted = (
+            strategy if isinstance(strategy, strategies.TargetedStrategy) else None
+        )
+        self.loop = loop
+        self.polling = threading.Lock()
+        self.buffer = threading.Lock()
+        self.cleared = False
+        self.affected = set[strategies.Tag]()
+        self.watcher: asyncio.Task[None] | None = None
+        self.starting = False
+        self.closed = False
+
+    def invalidate(self) -> None:
+        """
+        Applies the invalidations drained from the strategy so far.
+        """
+        self.watch()
+        if not self.cleared and not self.affected:
+            return
+        if not self.polling.acquire(blocking=False):
+            # Another thread is applying the pending invalidations.
+            return
+        try:
+            with self.buffer:
+                clear, affected = self.cleared, self.affected
+                self.cleared, self.affected = False, set[strategies.Tag]()
+            for entries, lock in zip(self.shards, self.locks):
+                with lock:
+                    entries.apply(clear, affected)
+        finally:
+            self.polling.release()
+
+    def watch(self) -> None:
+        """
+        Ensures the task draining the strategy runs on its event loop,
+        restarting it if it died.
+        """
+        if self.starting or (self.watcher is not None and not self.watcher.done()):
+            return
+        if self.loop.is_closed():
+            return
+        self.starting = True
+        self.loop.call_soon_threadsafe(self._start)
+
+    def drain(self) -> None:
+        """
+        Buffers the invalidations of the events the strategy consumes, on the
+        event loop of the strategy.
+        """
+        clear = self.strategy.clear()
+        affected = _NO_TAGS if self.targeted is None else self.targeted.affected()
+        if clear or affected:
+            with self.buffer:
+                self.cleared = self.cleared or clear
+                self.affected.update(affected)
+
+    def close(self) -> None:
+        """
+        Stops draining the strategy, once the cached function is gone. May be
+        called from any thread, as by the garbage collector.
+        """
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._stop)
+
+    def _start(self) -> None:
+        self.starting = False
+        if self.closed or (self.watcher is not None and not self.watcher.done()):
+            return
+
+        if self.watcher is not None and not self.watcher.cancelled():
+            logger.error(
+                "Cache invalidation task stopped, restarting.",
+                exc_info=self.watcher.exception(),
+            )
+
+        async def watcher() -> None:
+            while True:
+                await self.strategy.wait()
+                self.drain()
+                # As for `_Entries.watch`, wait may return without any event
+                # being consumed.
+                await asyncio.sleep(0)
+
+        self.drain()
+        self.watcher = self.loop.create_task(watcher())
+
+    def _stop(self) -> None:
+        # On the loop, after any pending _start, so no watcher outlives it.
+        self.closed = True
+        if self.watcher is not None:
+            self.watcher.cancel()
+
+    def lookup(
+        self,
+        key: Hashable,
+        compute_tags: Callable[[], Iterable[strategies.Tag] | None],
+    ) -> tuple[Literal["hit", "raise", "wait", "compute"], Any]:
+        """
+        Returns the value of key on a hit, or its cached exception. Otherwise
+        returns the future of its computation, either one in flight to wait
+        for, or a new one the caller must compute and then `settle`.
+        """
+        n = hash(key) % len(self.shards)
+        entries, lock = self.shards[n], self.locks[n]
+
+        if entries.policy is None:
+            if (waiter := entries.futures.get(key)) is not None:
+                return "wait", waiter
+            if (
+                raised := entries.errors.get(key)
+            ) is not None and time.monotonic() < raised.expires:
+                return "raise", raised
+            try:
+                return "hit", entries.peek(key)
+            except KeyError:
+                pass
+
+        with lock:
+            if (waiter := entries.futures.get(key)) is not None:
+                return "wait", waiter
+            if (raised := entries.raised(key)) is not None:
+                return "raise", raised
+            try:
+                return "hit", entries.get(key)
+            except KeyError:
+                pass
+            future = concurrent.futures.Future[T]()
+            return "compute", entries.pending(key, compute_tags(), future)
+
+    def settle(
+        self,
+        key: Hashable,
+        future: concurrent.futures.Future[T],
+        value: T,
+    ) -> None:
+        # The threads waiting for the value get it even if storing it fails.
+        future.set_result(value)
+        n = hash(key) % len(self.shards)
+        try:
+            with self.locks[n]:
+                self.shards[n].admit(key, future, value)
+        except Exception:
+            logger.exception("Failed to store cache entry.")
+
+    def fail(
+        self,
+        key: Hashable,
+        future: concurrent.futures.Future[T],
+        exception: BaseException,
+    ) -> None:
+        n = hash(key) % len(self.shards)
+        with self.locks[n]:
+            self.shards[n].fail(key, future, exception)
+        future.set_exception(exception)
+
+
+def sync_cache(
+    strategy: strategies.Strategy,
+    statistics_callback: Callable[[Statistic], None] = lambda _: None,
+    tags: Callable[..., Iterable[strategies.Tag]] | None = None,
+    max_entries: int | None = None,
+    max_bytes: int | None = None,
+    policy: Callable[[], eviction.EvictionPolicy] = eviction.LRU,
+    sizeof: Callable[[Any], int] = sys.getsizeof,
+    ttl: datetime.timedelta | None = None,
+    storage: Callable[[], storage.Storage[Any]] = storage.MemoryStorage,
+    codec: serialization.Codec[Any] | None = None,
+    key: Callable[..., Hashable] | Iterable[str] | None = None,
+    shards: int = 16,
+    negative_ttl: datetime.timedelta | None = None,
+    is_negative: Callable[[Any], bool] = _empty,
+    loop: asyncio.AbstractEventLoop | None = None,
+) -> Callable[[Callable[P, T]], Callable[P, T]]:
+    """
+    Decorator for caching synchronous function calls, safe to call from any
+    number of threads, such as the workers of a thread pool running psycopg
+    queries.
+
+    Takes the same strategies and options as `cache`, except for those
+    needing background tasks. The listener keeps running on its event `loop`,
+    by default the loop running where the function is decorated, where a task
+    collects the invalidations that calls then apply. Concurrent calls
+    for one key wait for a single computation, calls for other keys are not
+    held up by it. An exception raised by the computation is raised in every
+    waiting thread and the next call retries it, unless `negative_ttl` caches
+    it.
+
+    Entries are split into `shards` by key hash, each with a lock of its own,
+    and hits on unbounded caches take no lock at all, so threads scale on
+    free-threaded Python builds. `max_entries` and `max_bytes` are split
+    between the shards so that they add up to the bounds, each shard evicting
+    on its own.
+    """
+
+    def outer(fn: Callable[P, T]) -> Callable[P, T]:
+        try:
+            owner = asyncio.get_running_loop() if loop is None else loop
+        except RuntimeError:
+            raise ValueError(
+                "sync_cache needs the event loop of its listener, decorate "
+                "within it or pass it as loop"
+            ) from None
+
+        count = shards if max_entries is None else max(1, min(shards, max_entries))
+
+        # The remainder goes to the first shards, so the bounds add up exactly.
+        def share(bound: int | None, n: int) -> int | None:
+            return None if bound is None else bound // count + (n < bound % count)
+
+        entries = _Shards[T](
+            count,
+            lambda n: _Entries[T](
+                tagged=tags is not None,
+                max_entries=share(max_entries, n),
+                max_bytes=share(max_bytes, n),
+                policy=policy,
+                sizeof=sizeof,
+                statistics_callback=statistics_callback,
+                ttl=ttl,
+                stale_while_revalidate=None,
+                store=storage(),
+                codec=codec,
+                negative_ttl=negative_ttl,
+                is_negative=is_negative,
+            ),
+            strategy,
+            owner,
+        )
+        build_key = _key_builder(fn, key)
+
+        def inner(*args: P.args, **kwargs: P.kwargs) -> T:
+            # If db-conn is down, disable cache.
+            if not strategy.connection_healthy():
+                logger.critical("Database connection is closed, caching disabled.")
+                return fn(*args, **kwargs)
+
+            entries.invalidate()
+
+            key = build_key(*args, **kwargs)
+            state, found = entries.lookup(
+                key,
+                lambda: None if tags is None else tags(*args, **kwargs),
+            )
+
+            if state != "compute":
+                logger.debug("Cache hit")
+                statistics_callback("hit")
+                if state == "raise":
+                    found.reraise()
+                return found.result() if state == "wait" else found
 
-            # Initialize Future to prevent cache stampedes.
-            cached[key] = waiter = asyncio.Future[T]()
+            logger.debug("Cache miss")
+            statistics_callback("miss")
 
             try:
-                # # Attempt to compute result and set for waiter
-                waiter.set_result(await fn(*args, **kwargs))
-            except Exception as e:
-                # Remove key from cache on failure.
-                cached.pop(key, None)
-                # Propagate exception to all awaiting the future.
-                waiter.set_exception(e)
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                entries.fail(key, found, e)
+                raise
 
-            return await waiter
+            entries.settle(key, found, result)
+            return result
 
+        weakref.finalize(inner, entries.close)
         return inner
 
     return outer
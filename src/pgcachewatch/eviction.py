@@ -0,0 +1,199 @@
+import collections
+from typing import Hashable, Protocol
+
+
+class EvictionPolicy(Protocol):
+    """
+    Protocol for the policies deciding which entry a bounded cache evicts.
+
+    All operations are expected to run in constant time. Keys are inserted once
+    their value is computed and admitted, accessed on every lookup, and removed
+    when the cache drops them for any reason.
+    """
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def access(self, key: Hashable) -> None:
+        """
+        Records a lookup of key, regardless of whether it is in the cache.
+        """
+        raise NotImplementedError
+
+    def insert(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+    def remove(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+    def victim(self) -> Hashable:
+        """
+        Returns the key that should be evicted next.
+
+        Raises:
+            KeyError: If the policy tracks no keys.
+        """
+        raise NotImplementedError
+
+    def admit(self, candidate: Hashable, victim: Hashable) -> bool:
+        """
+        Decides whether candidate is worth evicting victim for.
+        """
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class LRU(EvictionPolicy):
+    """
+    Evicts the least recently used key.
+    """
+
+    def __init__(self) -> None:
+        self._keys = collections.OrderedDict[Hashable, None]()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def access(self, key: Hashable) -> None:
+        if key in self._keys:
+            self._keys.move_to_end(key)
+
+    def insert(self, key: Hashable) -> None:
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+
+    def remove(self, key: Hashable) -> None:
+        self._keys.pop(key, None)
+
+    def victim(self) -> Hashable:
+        try:
+            return next(iter(self._keys))
+        except StopIteration:
+            raise KeyError("victim from an empty policy") from None
+
+    def admit(self, candidate: Hashable, victim: Hashable) -> bool:
+        return True
+
+    def clear(self) -> None:
+        self._keys.clear()
+
+
+class _Bucket:
+    __slots__ = ("frequency", "keys", "prev", "next")
+
+    def __init__(self, frequency: int) -> None:
+        self.frequency = frequency
+        self.keys = collections.OrderedDict[Hashable, None]()
+        self.prev = self.next = self
+
+
+class LFU(EvictionPolicy):
+    """
+    Evicts the least frequently used key, the least recently used one among
+    keys with equal frequency. Keys live in a linked list of buckets, one per
+    frequency in ascending order, so every operation is constant time.
+    """
+
+    def __init__(self) -> None:
+        self._head = _Bucket(0)
+        self._buckets = dict[Hashable, _Bucket]()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def access(self, key: Hashable) -> None:
+        if (bucket := self._buckets.get(key)) is None:
+            return
+
+        following = bucket.next
+        if following is self._head or following.frequency != bucket.frequency + 1:
+            following = self._link(_Bucket(bucket.frequency + 1), after=bucket)
+
+        following.keys[key] = None
+        self._buckets[key] = following
+        self._discard(bucket, key)
+
+    def insert(self, key: Hashable) -> None:
+        self.remove(key)
+        first = self._head.next
+        if first is self._head or first.frequency != 1:
+            first = self._link(_Bucket(1), after=self._head)
+        first.keys[key] = None
+        self._buckets[key] = first
+
+    def remove(self, key: Hashable) -> None:
+        if (bucket := self._buckets.pop(key, None)) is not None:
+            self._discard(bucket, key)
+
+    def victim(self) -> Hashable:
+        if self._head.next is self._head:
+            raise KeyError("victim from an empty policy")
+        return next(iter(self._head.next.keys))
+
+    def admit(self, candidate: Hashable, victim: Hashable) -> bool:
+        return True
+
+    def clear(self) -> None:
+        self._head.prev = self._head.next = self._head
+        self._buckets.clear()
+
+    @staticmethod
+    def _link(bucket: _Bucket, after: _Bucket) -> _Bucket:
+        bucket.prev, bucket.next = after, after.next
+        after.next.prev = bucket
+        after.next = bucket
+        return bucket
+
+    @staticmethod
+    def _discard(bucket: _Bucket, key: Hashable) -> None:
+        del bucket.keys[key]
+        if not bucket.keys:
+            bucket.prev.next = bucket.next
+            bucket.next.prev = bucket.prev
+
+
+class TinyLFU(LRU):
+    """
+    LRU eviction guarded by TinyLFU admission.
+
+    The access frequency of every key, cached or not, is estimated with a
+    count-min sketch that is halved every `sample_size` accesses, so the
+    estimates follow recent popularity. A new entry is only admitted if it has
+    been requested more often than the entry it would evict, which keeps
+    one-off requests from flushing popular entries out of the cache.
+    """
+
+    def __init__(
+        self,
+        width: int = 4_096,
+        depth: int = 4,
+        sample_size: int | None = None,
+    ) -> None:
+        super().__init__()
+        self._width = width
+        self._seeds = range(depth)
+        self._sketch = [[0] * width for _ in self._seeds]
+        self._sample_size = sample_size or 10 * width
+        self._samples = 0
+
+    def access(self, key: Hashable) -> None:
+        super().access(key)
+        for seed, row in zip(self._seeds, self._sketch):
+            row[hash((seed, key)) % self._width] += 1
+
+        self._samples += 1
+        if self._samples >= self._sample_size:
+            self._samples //= 2
+            for row in self._sketch:
+                row[:] = [count // 2 for count in row]
+
+    def estimate(self, key: Hashable) -> int:
+        return min(
+            row[hash((seed, key)) % self._width]
+            for seed, row in zip(self._seeds, self._sketch)
+        )
+
+    def admit(self, candidate: Hashable, victim: Hashable) -> bool:
+        return self.estimate(candidate) > self.estimate(victim)
@@ -1,7 +1,13 @@
 import asyncio
+import contextlib
 import datetime
-import json
-from typing import Callable, Protocol
+import functools
+import itertools
+import logging
+import random
+import re
+import urllib.parse
+from typing import Any, Awaitable, Callable, Hashable, Protocol
 
 import asyncpg
 import websockets
@@ -9,6 +15,12 @@ import websockets
 from . import models
 from .logconfig import logger
 
+json_loads: Callable[[str | bytes | bytearray], Any]
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 
 def _critical_termination_listener(*_: object, **__: object) -> None:
     # Must be defined in the global namespace, as ayncpg keeps
@@ -17,9 +29,170 @@ def _critical_termination_listener(*_: object, **__: object) -> None:
     logger.critical("Connection is closed / terminated.")
 
 
+def invalidate_event(channel: models.PGChannel) -> models.Event:
+    """
+    Creates a synthetic event telling consumers to drop everything, used
+    whenever events may have been lost.
+    """
+    return models.Event(
+        channel=channel,
+        operation="invalidate",
+        sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+        table="",
+    )
+
+
+def backoff(
+    attempt: int,
+    min_backoff: datetime.timedelta,
+    max_backoff: datetime.timedelta,
+) -> float:
+    """
+    Seconds to wait before retry number `attempt`, growing exponentially
+    from `min_backoff` up to `max_backoff` with full jitter, so clients that
+    lost the same server do not all come back at the same moment.
+    """
+    ceiling = min(
+        max_backoff.total_seconds(),
+        min_backoff.total_seconds() * 2 ** min(attempt, 32),
+    )
+    return random.uniform(0, ceiling)
+
+
+def parse_event(
+    channel: models.PGChannel,
+    payload: str | bytes | bytearray,
+    received_at: datetime.datetime | None = None,
+) -> models.Event:
+    """
+    Parses a JSON payload into a `models.Event`, using orjson when installed.
+    Passing `received_at` saves the model from calling its default factory, a
+    `received_at` already present in the payload takes precedence.
+    """
+    return _validate_event(channel, json_loads(payload), received_at)
+
+
+def parse_events(
+    channel: models.PGChannel,
+    payload: str | bytes | bytearray,
+    received_at: datetime.datetime | None = None,
+) -> list[models.Event]:
+    """
+    Parses a JSON payload holding either one event or a batch of events as a
+    JSON array, decoding the whole batch in one pass. Invalid events of a
+    batch are logged and skipped, the valid ones are still returned.
+    """
+    decoded = json_loads(payload)
+    if not isinstance(decoded, list):
+        return [_validate_event(channel, decoded, received_at)]
+
+    events = list[models.Event]()
+    for item in decoded:
+        try:
+            events.append(_validate_event(channel, item, received_at))
+        except Exception:
+            logger.exception("Failed to parse event: `%s`.", item)
+    return events
+
+
+_COMPACT_OPERATIONS: dict[str, models.OPERATIONS] = {
+    "i": "insert",
+    "u": "update",
+    "d": "delete",
+    "t": "truncate",
+}
+
+
+def _validate_event(
+    channel: models.PGChannel,
+    event_data: dict[str, Any],
+    received_at: datetime.datetime | None,
+) -> models.Event:
+    if "o" in event_data:
+        return _expand_compact_event(channel, event_data, received_at)
+
+    # Add or overwrite channel key with the current channel
+    event_data["channel"] = channel
+
+    if received_at is not None:
+        event_data.setdefault("received_at", received_at)
+
+    return models.Event.model_validate(event_data)
+
+
+def _expand_compact_event(
+    channel: models.PGChannel,
+    event_data: dict[str, Any],
+    received_at: datetime.datetime | None,
+) -> models.Event:
+    """
+    Validates an event in the compact payload format of `pgcachewatch install
+    --compact`. The time it was sent is passed on as seconds since the epoch,
+    which the model converts without parsing a string.
+    """
+    expanded = {
+        "channel": channel,
+        "operation": _COMPACT_OPERATIONS[event_data["o"]],
+        "sent_at": event_data["s"] / 1_000_000,
+        "table": event_data["t"],
+        "keys": event_data.get("k", []),
+    }
+    if received_at is not None:
+        expanded["received_at"] = received_at
+    return models.Event.model_validate(expanded)
+
+
+class EventCoalescer:
+    """
+    Collapses identical events while one of them is still waiting in a queue.
+
+    Two events are identical if they share channel, table, operation and keys.
+    An event is dropped if an identical event is still pending, sent no more
+    than `window` before it. Consumers can not tell the difference, as the
+    pending event invalidates the same data once picked up, so the queue holds
+    at most one event per distinct change no matter how hot a table is.
+    """
+
+    def __init__(self, window: datetime.timedelta) -> None:
+        self._window = window
+        self._pending = dict[Hashable, models.Event]()
+        self.coalesced = 0
+
+    @staticmethod
+    def _signature(event: models.Event) -> Hashable:
+        return (
+            event.channel,
+            event.table,
+            event.operation,
+            tuple(tuple(key.items()) for key in event.keys),
+        )
+
+    def admit(self, event: models.Event) -> bool:
+        """
+        Returns False if the event duplicates a pending one, else records it as
+        pending and returns True.
+        """
+        signature = self._signature(event)
+        pending = self._pending.get(signature)
+        if pending is not None and event.sent_at - pending.sent_at <= self._window:
+            self.coalesced += 1
+            return False
+        self._pending[signature] = event
+        return True
+
+    def consumed(self, event: models.Event) -> None:
+        """
+        Marks an event as taken out of the queue.
+        """
+        signature = self._signature(event)
+        if self._pending.get(signature) is event:
+            del self._pending[signature]
+
+
 def create_event_inserter(
     queue: asyncio.Queue[models.Event],
     max_latency: datetime.timedelta,
+    coalescer: EventCoalescer | None = None,
 ) -> Callable[
     [
         models.PGChannel,
@@ -29,9 +202,11 @@ def create_event_inserter(
 ]:
     """
     Creates a callable that parses JSON payloads into `models.Event`
-    objects and inserts them into a queue. If the event's latency
+    objects and inserts them into a queue. Payloads may hold a batch of
+    events as a JSON array. If the event's latency
     exceeds the specified maximum, it logs a warning. Errors during
-    parsing or inserting are logged as exceptions.
+    parsing or inserting are logged as exceptions. With a coalescer,
+    events duplicating one still in the queue are dropped.
     """
 
     def parse_and_insert(
@@ -41,14 +216,10 @@ def create_event_inserter(
         """
         Parses a JSON payload and inserts it into the queue as an `models.Event` object.
         """
-        try:
-            event_data = json.loads(payload)
-
-            # Add or overwrite channel key with the current channel
-            event_data["channel"] = channel
-
-            parsed_event = models.Event.model_validate(event_data)
+        received_at = datetime.datetime.now(tz=datetime.timezone.utc)
 
+        try:
+            parsed_events = parse_events(channel, payload, received_at)
         except Exception:
             logger.exception(
                 "Failed to parse payload: `%s`.",
@@ -56,15 +227,27 @@ def create_event_inserter(
             )
             return
 
-        if parsed_event.latency > max_latency:
+        for parsed_event in parsed_events:
+            insert(channel, parsed_event, received_at)
+
+    def insert(
+        channel: models.PGChannel,
+        parsed_event: models.Event,
+        received_at: datetime.datetime,
+    ) -> None:
+        if coalescer is not None and not coalescer.admit(parsed_event):
+            logger.debug("Coalesced event: `%s`.", parsed_event)
+            return
+
+        if (latency := received_at - parsed_event.sent_at) > max_latency:
             logger.warning(
                 "Event latency (%s) exceeds maximum (%s): `%s` from `%s`.",
-                parsed_event.latency,
+                latency,
                 max_latency,
                 parsed_event,
                 channel,
             )
-        else:
+        elif logger.isEnabledFor(logging.INFO):
             logger.info(
                 "Inserting event into queue: `%s` from `%s`.",
                 parsed_event,
@@ -74,6 +257,8 @@ def create_event_inserter(
         try:
             queue.put_nowait(parsed_event)
         except Exception:
+            if coalescer is not None:
+                coalescer.consumed(parsed_event)
             logger.exception(
                 "Unexpected error inserting event into queue: `%s`.",
                 parsed_event,
@@ -120,7 +305,77 @@ class EventQueueProtocol(Protocol):
         raise NotImplementedError
 
 
-class PGEventQueue(asyncio.Queue[models.Event]):
+async def wait_for_events(
+    queue: EventQueueProtocol,
+    poll_interval: datetime.timedelta = datetime.timedelta(milliseconds=10),
+) -> None:
+    """
+    Returns once the queue may hold events. Queues that signal arrivals through
+    an async `wait` method are awaited, others are polled at `poll_interval`.
+    """
+    if (wait := getattr(queue, "wait", None)) is not None:
+        await wait()
+    else:
+        await asyncio.sleep(poll_interval.total_seconds())
+
+
+class EventQueue(asyncio.Queue[models.Event]):
+    """
+    Base class of the event queues fed by a listener, holding the parts that
+    do not depend on where events come from.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 0,
+        max_latency: datetime.timedelta = datetime.timedelta(milliseconds=500),
+        coalesce_window: datetime.timedelta | None = None,
+    ) -> None:
+        super().__init__(maxsize=max_size)
+        self._max_latency = max_latency
+        self._coalescer = (
+            None if coalesce_window is None else EventCoalescer(coalesce_window)
+        )
+        self._arrival: asyncio.Future[None] | None = None
+
+    def _put(self, event: models.Event) -> None:
+        super()._put(event)
+        if self._arrival is not None:
+            if not self._arrival.done():
+                self._arrival.set_result(None)
+            self._arrival = None
+
+    def _get(self) -> models.Event:
+        event = super()._get()
+        if self._coalescer is not None:
+            self._coalescer.consumed(event)
+        return event
+
+    async def wait(self) -> None:
+        """
+        Returns once the queue holds at least one event, without consuming it.
+        """
+        if not self.empty():
+            return
+        if self._arrival is None:
+            self._arrival = asyncio.get_running_loop().create_future()
+        await asyncio.shield(self._arrival)
+
+    def connection_healthy(self) -> bool:
+        raise NotImplementedError
+
+    def _invalidate_all(self, channel: models.PGChannel) -> None:
+        """
+        Replaces the queued events by a synthetic `invalidate` event, used
+        after a gap in which events may have been lost.
+        """
+        # Everything queued predates the gap and is superseded.
+        while not self.empty():
+            self.get_nowait()
+        self.put_nowait(invalidate_event(channel))
+
+
+class PGEventQueue(EventQueue):
     """
     A PostgreSQL event queue that listens to a specified
     channel and stores incoming events.
@@ -130,11 +385,12 @@ class PGEventQueue(asyncio.Queue[models.Event]):
         self,
         max_size: int = 0,
         max_latency: datetime.timedelta = datetime.timedelta(milliseconds=500),
+        coalesce_window: datetime.timedelta | None = None,
     ) -> None:
-        super().__init__(maxsize=max_size)
+        super().__init__(max_size, max_latency, coalesce_window)
         self._pg_channel: None | models.PGChannel = None
         self._pg_connection: None | asyncpg.Connection = None
-        self._max_latency = max_latency
+        self._supervisor: asyncio.Task[None] | None = None
 
     async def connect(
         self,
@@ -170,6 +426,66 @@ class PGEventQueue(asyncio.Queue[models.Event]):
         )
         ```
         """
+        self._ensure_unconnected()
+        connection.add_termination_listener(_critical_termination_listener)
+        await self._listen(connection, channel)
+
+    async def connect_forever(
+        self,
+        connector: str | Callable[[], Awaitable[asyncpg.Connection]],
+        channel: models.PGChannel = models.DEFAULT_PG_CHANNE,
+        min_backoff: datetime.timedelta = datetime.timedelta(milliseconds=100),
+        max_backoff: datetime.timedelta = datetime.timedelta(seconds=30),
+    ) -> None:
+        """
+        Connects the PGEventQueue to a PostgreSQL channel and keeps it connected.
+
+        Connections are obtained from `connector`, either a DSN or a coroutine
+        function returning a connection, such as `pool.acquire`. Whenever the
+        connection is lost a background task reconnects with exponential
+        backoff, listens on the channel again and queues a synthetic
+        `invalidate` event, as notifications sent while disconnected are lost.
+        Caches are bypassed while disconnected and resume once reconnected.
+
+        Returns once the first connection is established, retrying with the
+        same backoff until then.
+
+        Raises:
+        - RuntimeError: If the PGEventQueue is already connected to a
+        channel or connection.
+
+        Usage:
+        ```python
+        await pg_event_queue.connect_forever("postgres://...", channel)
+        ```
+        """
+        self._ensure_unconnected()
+        if isinstance(connector, str):
+            connector = functools.partial(asyncpg.connect, connector)
+
+        terminated = await self._reconnect(connector, channel, min_backoff, max_backoff)
+        self._supervisor = asyncio.create_task(
+            self._supervise(connector, channel, min_backoff, max_backoff, terminated)
+        )
+        self._supervisor.add_done_callback(_critical_termination_listener)
+
+    async def close(self) -> None:
+        """
+        Stops reconnecting and closes the connection opened by
+        `connect_forever`. Connections passed to `connect` are left to their
+        owner.
+        """
+        if self._supervisor is None:
+            return
+        self._supervisor.cancel()
+        self._supervisor = None
+        if self._pg_connection is not None and not self._pg_connection.is_closed():
+            await self._pg_connection.close()
+
+    def connection_healthy(self) -> bool:
+        return bool(self._pg_connection and not self._pg_connection.is_closed())
+
+    def _ensure_unconnected(self) -> None:
         if self._pg_channel or self._pg_connection:
             raise RuntimeError(
                 "PGEventQueue instance is already connected to a channel and/or "
@@ -177,30 +493,92 @@ class PGEventQueue(asyncio.Queue[models.Event]):
                 "PGEventQueue instance."
             )
 
+    async def _listen(
+        self,
+        connection: asyncpg.Connection,
+        channel: models.PGChannel,
+        gap: bool = False,
+    ) -> None:
+        event_handler = create_event_inserter(
+            self,
+            self._max_latency,
+            self._coalescer,
+        )
+        await connection.add_listener(
+            channel,
+            lambda *x: event_handler(channel, x[-1]),
+        )
+
+        # The synthetic event is queued before the queue reports healthy, so
+        # no cache reads a value computed before the gap in between.
+        if gap:
+            self._invalidate_all(channel)
         self._pg_channel = channel
         self._pg_connection = connection
-        self._pg_connection.add_termination_listener(_critical_termination_listener)
 
-        event_handler = create_event_inserter(self, self._max_latency)
-        await self._pg_connection.add_listener(
-            self._pg_channel,
-            lambda *x: event_handler(self._pg_channel, x[-1]),
-        )
+    async def _reconnect(
+        self,
+        connector: Callable[[], Awaitable[asyncpg.Connection]],
+        channel: models.PGChannel,
+        min_backoff: datetime.timedelta,
+        max_backoff: datetime.timedelta,
+        gap: bool = False,
+    ) -> asyncio.Event:
+        for attempt in itertools.count():
+            terminated = asyncio.Event()
+            connection: asyncpg.Connection | None = None
+            try:
+                connection = await connector()
+                connection.add_termination_listener(lambda *_: terminated.set())
+                await self._listen(connection, channel, gap)
+            except Exception:
+                if connection is not None:
+                    connection.terminate()
+                delay = backoff(attempt, min_backoff, max_backoff)
+                logger.exception("Failed to connect, retrying in %.2fs.", delay)
+                await asyncio.sleep(delay)
+            else:
+                return terminated
+        raise AssertionError("unreachable")
 
-    def connection_healthy(self) -> bool:
-        return bool(self._pg_connection and not self._pg_connection.is_closed())
+    async def _supervise(
+        self,
+        connector: Callable[[], Awaitable[asyncpg.Connection]],
+        channel: models.PGChannel,
+        min_backoff: datetime.timedelta,
+        max_backoff: datetime.timedelta,
+        terminated: asyncio.Event,
+    ) -> None:
+        while True:
+            await terminated.wait()
+            logger.warning("Connection is closed / terminated, reconnecting.")
+            terminated = await self._reconnect(
+                connector, channel, min_backoff, max_backoff, gap=True
+            )
+
+
+class WSEventQueue(EventQueue):
+    """
+    An event queue fed by a `pg_event_distributor` over a WebSocket.
 
+    Use `connect_forever` with the URL of the distributor's channel endpoint to
+    reconnect with exponential backoff whenever the connection is lost. The
+    distributor numbers its events and keeps the latest ones, so after a short
+    gap the client resumes from the last event it received and only long gaps
+    end in a synthetic `invalidate` event. The queue is unhealthy while
+    disconnected.
+    """
 
-class WSEventQueue(asyncio.Queue[models.Event]):
     def __init__(
         self,
         max_size: int = 0,
         max_latency: datetime.timedelta = datetime.timedelta(milliseconds=500),
+        coalesce_window: datetime.timedelta | None = None,
     ) -> None:
-        super().__init__(maxsize=max_size)
-        self._max_latency = max_latency
+        super().__init__(max_size, max_latency, coalesce_window)
         self._handler_task: asyncio.Task | None = None
         self._ws: websockets.WebSocketClientProtocol | None = None
+        self._sequence: int | None = None
 
     async def connect(
         self,
@@ -208,13 +586,58 @@ class WSEventQueue(asyncio.Queue[models.Event]):
         channel: models.PGChannel = models.DEFAULT_PG_CHANNE,
     ) -> None:
         async def _handler(ws: websockets.WebSocketClientProtocol) -> None:
-            event_handler = create_event_inserter(self, self._max_latency)
+            event_handler = create_event_inserter(
+                self,
+                self._max_latency,
+                self._coalescer,
+            )
             while True:
                 try:
                     event_handler(self._pg_channel, await ws.recv())
                 except websockets.ConnectionClosedOK:
                     break
 
+        self._ensure_unconnected()
+        self._ws = ws
+        self._pg_channel = channel
+        self._handler_task = asyncio.create_task(_handler(ws))
+        self._handler_task.add_done_callback(_critical_termination_listener)
+
+    async def connect_forever(
+        self,
+        url: str,
+        channel: models.PGChannel = models.DEFAULT_PG_CHANNE,
+        min_backoff: datetime.timedelta = datetime.timedelta(milliseconds=100),
+        max_backoff: datetime.timedelta = datetime.timedelta(seconds=30),
+    ) -> None:
+        """
+        Connects to the distributor at url, such as
+        "ws://localhost:8000/pgpubsub/ch_pgcachewatch_table_change", and keeps
+        it connected. Returns once connected, retrying with the same backoff
+        until then.
+
+        Raises:
+        - RuntimeError: If the WSEventQueue is already connected.
+        """
+        self._ensure_unconnected()
+        await self._open(url, min_backoff, max_backoff)
+        self._handler_task = asyncio.create_task(
+            self._supervise(url, channel, min_backoff, max_backoff)
+        )
+        self._handler_task.add_done_callback(_critical_termination_listener)
+
+    async def close(self) -> None:
+        if self._handler_task is not None:
+            self._handler_task.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+
+    def connection_healthy(self) -> bool:
+        task_ok = bool(self._handler_task and not self._handler_task.done())
+        ws_ok = bool(self._ws and self._ws.close_code is None)
+        return task_ok and ws_ok
+
+    def _ensure_unconnected(self) -> None:
         if self._handler_task is not None:
             raise RuntimeError(
                 "WSEventQueue instance is already connected to a channel and/or "
@@ -222,12 +645,439 @@ class WSEventQueue(asyncio.Queue[models.Event]):
                 "WSEventQueue instance."
             )
 
-        self._ws = ws
-        self._pg_channel = channel
-        self._handler_task = asyncio.create_task(_handler(ws))
-        self._handler_task.add_done_callback(_critical_termination_listener)
+    async def _open(
+        self,
+        url: str,
+        min_backoff: datetime.timedelta,
+        max_backoff: datetime.timedelta,
+    ) -> None:
+        for attempt in itertools.count():
+            if self._sequence is not None:
+                url = _with_query(url, after=str(self._sequence))
+            try:
+                self._ws = await websockets.connect(url)
+            except (OSError, websockets.WebSocketException):
+                delay = backoff(attempt, min_backoff, max_backoff)
+                logger.exception("Failed to connect, retrying in %.2fs.", delay)
+                await asyncio.sleep(delay)
+            else:
+                return
+
+    async def _supervise(
+        self,
+        url: str,
+        channel: models.PGChannel,
+        min_backoff: datetime.timedelta,
+        max_backoff: datetime.timedelta,
+    ) -> None:
+        event_handler = create_event_inserter(
+            self,
+            self._max_latency,
+            self._coalescer,
+        )
+        while True:
+            assert self._ws is not None
+            with contextlib.suppress(websockets.ConnectionClosed):
+                while True:
+                    payload = await self._ws.recv()
+                    event_handler(channel, payload)
+                    if (sequence := _last_sequence(payload)) is not None:
+                        self._sequence = sequence
+
+            logger.warning("Distributor connection is closed, reconnecting.")
+            await self._open(url, min_backoff, max_backoff)
+            # Without a sequence number the distributor can not tell what was
+            # missed, otherwise it replays it or sends an invalidate event.
+            if self._sequence is None:
+                self._invalidate_all(channel)
+
+
+_DIGITS = re.compile(rb"\d+")
+
+
+def _last_sequence(payload: str | bytes) -> int | None:
+    """
+    Returns the sequence number of the last event in a distributor payload.
+
+    The distributor stamps it as the first field of every event, so a single
+    event is read from its prefix without decoding it again. Batches are
+    decoded, as the row keys of an event may hold a `seq` field of their own.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if payload.startswith(b'{"seq":'):
+        digits = _DIGITS.match(payload, len(b'{"seq":'))
+        return None if digits is None else int(digits[0])
+    if not payload.startswith(b"["):
+        return None
+    try:
+        decoded = json_loads(payload)
+    except ValueError:
+        return None
+    for event in reversed(decoded):
+        if isinstance(event, dict) and isinstance(event.get("seq"), int):
+            return event["seq"]
+    return None
+
+
+def _with_query(url: str, **params: str) -> str:
+    parts = urllib.parse.urlsplit(url)
+    query = dict(urllib.parse.parse_qsl(parts.query)) | params
+    return parts._replace(query=urllib.parse.urlencode(query)).geturl()
+
+
+# First line sent by a relay to a client it accepted, connections closed before
+# it count as failed attempts.
+RELAY_GREETING = b"pgcachewatch-relay\n"
+
+
+class UnixEventQueue(EventQueue):
+    """
+    An event queue fed by a `relay.UnixEventRelay` running in another process
+    on the same host.
+
+    The relay is reconnected with exponential backoff whenever the connection
+    is lost, and a synthetic `invalidate` event is queued as events sent in the
+    meantime are lost. The queue is unhealthy while disconnected.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 0,
+        max_latency: datetime.timedelta = datetime.timedelta(milliseconds=500),
+        coalesce_window: datetime.timedelta | None = None,
+    ) -> None:
+        super().__init__(max_size, max_latency, coalesce_window)
+        self._reader_task: asyncio.Task[None] | None = None
+        self._writer: asyncio.StreamWriter | None = None
+
+    async def connect(
+        self,
+        path: str,
+        channel: models.PGChannel = models.DEFAULT_PG_CHANNE,
+        min_backoff: datetime.timedelta = datetime.timedelta(milliseconds=100),
+        max_backoff: datetime.timedelta = datetime.timedelta(seconds=30),
+    ) -> None:
+        """
+        Connects to the relay listening on the Unix socket at path, returns
+        once connected.
+
+        Raises:
+        - RuntimeError: If the UnixEventQueue is already connected.
+        """
+        if self._reader_task is not None:
+            raise RuntimeError(
+                "UnixEventQueue instance is already connected. Only supports one "
+                "connection per UnixEventQueue instance."
+            )
+
+        reader = await self._open(path, min_backoff, max_backoff)
+        self._reader_task = asyncio.create_task(
+            self._handler(reader, path, channel, min_backoff, max_backoff)
+        )
+        self._reader_task.add_done_callback(_critical_termination_listener)
+
+    async def close(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
 
     def connection_healthy(self) -> bool:
-        task_ok = bool(self._handler_task and not self._handler_task.done())
-        ws_ok = bool(self._ws and not self._ws.closed)
-        return task_ok and ws_ok
+        task_ok = bool(self._reader_task and not self._reader_task.done())
+        return task_ok and bool(self._writer and not self._writer.is_closing())
+
+    async def _open(
+        self,
+        path: str,
+        min_backoff: datetime.timedelta,
+        max_backoff: datetime.timedelta,
+    ) -> asyncio.StreamReader:
+        for attempt in itertools.count():
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+                if await reader.readline() != RELAY_GREETING:
+                    writer.close()
+                    raise ConnectionRefusedError("relay refused the connection")
+            except OSError:
+                delay = backoff(attempt, min_backoff, max_backoff)
+                logger.exception("Failed to connect, retrying in %.2fs.", delay)
+                await asyncio.sleep(delay)
+            else:
+                self._writer = writer
+                return reader
+        raise AssertionError("unreachable")
+
+    async def _handler(
+        self,
+        reader: asyncio.StreamReader,
+        path: str,
+        channel: models.PGChannel,
+        min_backoff: datetime.timedelta,
+        max_backoff: datetime.timedelta,
+    ) -> None:
+        event_handler = create_event_inserter(
+            self,
+            self._max_latency,
+            self._coalescer,
+        )
+        while True:
+            with contextlib.suppress(ConnectionError):
+                while line := await reader.readline():
+                    event_handler(channel, line)
+
+            assert self._writer is not None
+            self._writer.close()
+            logger.warning("Relay connection is closed, reconnecting.")
+            reader = await self._open(path, min_backoff, max_backoff)
+            self._invalidate_all(channel)
+
+
+class Subscription:
+    """
+    A cursor over the shared event log of an `EventBus`.
+
+    Implements `EventQueueProtocol`, so it can be handed to any strategy in place
+    of the listener itself. Every subscription observes every event published
+    after it was created, independently of all other subscriptions.
+    """
+
+    def __init__(self, bus: "EventBus") -> None:
+        self._bus = bus
+        self._cursor = bus._pump()
+        self.missed = 0
+
+    def connection_healthy(self) -> bool:
+        return self._bus.connection_healthy()
+
+    def qsize(self) -> int:
+        """
+        Number of events available to this subscription.
+        """
+        return min(self._bus._pump() - self._cursor, self._bus.max_size)
+
+    async def wait(self) -> None:
+        """
+        Returns once this subscription has at least one event available.
+        """
+        while not self.qsize():
+            await wait_for_events(self._bus._source)
+
+    def get_nowait(self) -> models.Event:
+        """
+        Retrieves the next event for this subscription without waiting.
+
+        If the subscription fell more than `max_size` events behind, the events
+        that were overwritten are skipped and a single synthetic `invalidate`
+        event is returned in their place, as the subscriber can no longer know
+        what changed.
+
+        Raises:
+            QueueEmpty: If no event is available for this subscription.
+        """
+        head = self._bus._pump()
+
+        if self._cursor == head:
+            raise asyncio.QueueEmpty
+
+        if (lag := head - self._cursor) > self._bus.max_size:
+            self._cursor = head - self._bus.max_size
+            self.missed += lag - self._bus.max_size
+            logger.warning(
+                "Subscription fell behind, %s event(s) lost; emitting invalidate.",
+                lag - self._bus.max_size,
+            )
+            oldest = self._bus._ring[self._cursor % self._bus.max_size]
+            assert oldest is not None
+            return invalidate_event(oldest.channel)
+
+        event = self._bus._ring[self._cursor % self._bus.max_size]
+        self._cursor += 1
+        assert event is not None
+        return event
+
+
+class EventBus:
+    """
+    Fan-out layer that lets many consumers share one listener.
+
+    Events are drained from the source listener into a fixed size ring buffer
+    that every `Subscription` reads through its own cursor. Dispatch is O(1) per
+    event regardless of the number of subscribers, and memory is bounded by
+    `max_size` events; a subscriber that falls further behind than that gets a
+    synthetic `invalidate` event instead of the events it missed.
+
+    The source listener must not be consumed by anything else, as events taken
+    from it directly are never seen by the subscriptions.
+
+    Usage:
+    ```python
+    listener = listeners.PGEventQueue()
+    await listener.connect(connection)
+    bus = listeners.EventBus(listener)
+
+    strategy_a = strategies.Greedy(listener=bus.subscribe())
+    strategy_b = strategies.Greedy(listener=bus.subscribe())
+    ```
+    """
+
+    def __init__(
+        self,
+        source: EventQueueProtocol,
+        max_size: int = 1_024,
+    ) -> None:
+        if max_size <= 0:
+            raise ValueError("max_size must be greater than zero")
+
+        self._source = source
+        self._ring: list[models.Event | None] = [None] * max_size
+        self._head = 0
+        self.max_size = max_size
+
+    def _pump(self) -> int:
+        """
+        Moves all pending events from the source into the ring buffer and
+        returns the sequence number of the next event to be written.
+        """
+        while True:
+            try:
+                event = self._source.get_nowait()
+            except asyncio.QueueEmpty:
+                return self._head
+            self._ring[self._head % self.max_size] = event
+            self._head += 1
+
+    def connection_healthy(self) -> bool:
+        return self._source.connection_healthy()
+
+    def subscribe(self) -> Subscription:
+        """
+        Creates a new subscription that will receive all events published from
+        this point on.
+        """
+        return Subscription(self)
+
+
+class _ChannelQueue(EventQueue):
+    """
+    Queue receiving the events of one channel of a `PGChannelMultiplexer`,
+    healthy while the multiplexer is connected and listening on the channel.
+    """
+
+    def __init__(
+        self,
+        multiplexer: "PGChannelMultiplexer",
+        channel: models.PGChannel,
+    ) -> None:
+        super().__init__(0, multiplexer._max_latency, multiplexer._coalesce_window)
+        self._multiplexer = multiplexer
+        self._channel = channel
+        self._event_handler = create_event_inserter(
+            self,
+            self._max_latency,
+            self._coalescer,
+        )
+
+    def notify(self, *x: Any) -> None:
+        """
+        asyncpg listener callback for the channel.
+        """
+        self._event_handler(self._channel, x[-1])
+
+    def connection_healthy(self) -> bool:
+        entry = self._multiplexer._buses.get(self._channel)
+        return (
+            entry is not None
+            and entry[0] is self
+            and self._multiplexer.connection_healthy()
+        )
+
+
+class PGChannelMultiplexer:
+    """
+    Listens to any number of PostgreSQL channels over a single connection.
+
+    Channels can be added and removed at any time, before or after connecting.
+    Each channel has its own `EventBus`, and subscriptions only receive the
+    events of the channel they were created for. Every notification is parsed
+    once, regardless of the number of subscribers. Subscriptions of a channel
+    that is removed become unhealthy, so caches relying on them are bypassed
+    rather than served stale.
+
+    Usage:
+    ```python
+    multiplexer = listeners.PGChannelMultiplexer()
+    await multiplexer.connect(connection)
+
+    orders = strategies.Greedy(listener=await multiplexer.subscribe(orders_channel))
+    users = strategies.Greedy(listener=await multiplexer.subscribe(users_channel))
+    ```
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1_024,
+        max_latency: datetime.timedelta = datetime.timedelta(milliseconds=500),
+        coalesce_window: datetime.timedelta | None = None,
+    ) -> None:
+        self._max_size = max_size
+        self._max_latency = max_latency
+        self._coalesce_window = coalesce_window
+        self._buses = dict[models.PGChannel, tuple[_ChannelQueue, EventBus]]()
+        self._pg_connection: None | asyncpg.Connection = None
+
+    @property
+    def channels(self) -> frozenset[models.PGChannel]:
+        return frozenset(self._buses)
+
+    async def connect(self, connection: asyncpg.Connection) -> None:
+        """
+        Connects the multiplexer and starts listening on all channels added
+        so far.
+
+        Raises:
+        - RuntimeError: If the multiplexer is already connected.
+        """
+        if self._pg_connection is not None:
+            raise RuntimeError(
+                "PGChannelMultiplexer instance is already connected. Only "
+                "supports one connection per PGChannelMultiplexer instance."
+            )
+
+        self._pg_connection = connection
+        connection.add_termination_listener(_critical_termination_listener)
+        for channel, (queue, _) in list(self._buses.items()):
+            await connection.add_listener(channel, queue.notify)
+
+    async def add_channel(self, channel: models.PGChannel) -> None:
+        """
+        Starts listening on channel, if not already listening.
+        """
+        if channel in self._buses:
+            return
+
+        queue = _ChannelQueue(self, channel)
+        self._buses[channel] = (queue, EventBus(queue, self._max_size))
+        if self._pg_connection is not None:
+            await self._pg_connection.add_listener(channel, queue.notify)
+
+    async def remove_channel(self, channel: models.PGChannel) -> None:
+        """
+        Stops listening on channel, its subscriptions become unhealthy.
+        """
+        if (entry := self._buses.pop(channel, None)) is None:
+            return
+
+        if self._pg_connection is not None and not self._pg_connection.is_closed():
+            await self._pg_connection.remove_listener(channel, entry[0].notify)
+
+    async def subscribe(self, channel: models.PGChannel) -> Subscription:
+        """
+        Creates a subscription to the events of channel published from this
+        point on, adding the channel if needed.
+        """
+        await self.add_channel(channel)
+        return self._buses[channel][1].subscribe()
+
+    def connection_healthy(self) -> bool:
+        return bool(self._pg_connection and not self._pg_connection.is_closed())
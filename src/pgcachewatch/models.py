@@ -8,6 +8,7 @@ OPERATIONS = Literal[
     "update",
     "delete",
     "truncate",
+    "invalidate",
 ]
 
 PGChannel = NewType(
@@ -17,6 +18,8 @@ PGChannel = NewType(
 
 DEFAULT_PG_CHANNE = PGChannel("ch_pgcachewatch_table_change")
 
+Key = dict[str, str | int | float | bool | None]
+
 
 class DeadlineSetting(pydantic.BaseModel):
     """
@@ -45,9 +48,14 @@ class Event(pydantic.BaseModel):
 
     Attributes:
         channel: The PostgreSQL channel the event belongs to.
-        operation: The type of operation performed (insert, update or delete).
+        operation: The type of operation performed (insert, update, delete or
+            truncate). The synthetic `invalidate` operation is never emitted by
+            the database, it signals that events may have been lost and that
+            everything derived from the channel must be considered stale.
         sent_at: The timestamp when the event was sent.
         table: The table the event is associated with.
+        keys: The key columns of the changed rows, empty unless the event comes
+            from a row-level trigger.
         received_at: The timestamp when the event was received.
     """
 
@@ -55,6 +63,7 @@ class Event(pydantic.BaseModel):
     operation: OPERATIONS
     sent_at: pydantic.AwareDatetime
     table: str
+    keys: list[Key] = pydantic.Field(default_factory=list)
     received_at: pydantic.AwareDatetime = pydantic.Field(
         init=False,
         default_factory=lambda: datetime.datetime.now(
@@ -1,18 +1,314 @@
 """
 Facilitates WebSocket clients subscribing to PostgreSQL notifications via
 a single connection. Reduces PostgreSQL server load by sharing one connection
-among multiple clients
+among multiple clients, and one LISTEN per channel among all clients of it.
 
 Usage example:
 `uvicorn pgcachewatch.pg_event_distributor:main --factory`
+
+Or with one worker process per CPU:
+`python -m pgcachewatch.pg_event_distributor --workers 0`
 """
 
+import argparse
 import asyncio
+import collections
+import multiprocessing
+import multiprocessing.connection
+import os
+import secrets
+import signal
+import socket
+import time
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from types import FrameType
+from typing import AsyncGenerator, Literal, get_args
 
 import asyncpg
-from fastapi import Depends, FastAPI, Response, WebSocket, WebSocketDisconnect
+import uvicorn
+from fastapi import Depends, FastAPI, Response, WebSocket
+from fastapi.requests import HTTPConnection
+
+from pgcachewatch import listeners, models
+from pgcachewatch.logconfig import logger
+
+Overflow = Literal["drop-oldest", "invalidate", "disconnect"]
+
+# Sequence numbers start at a random stream prefix, so a number handed out by
+# another distributor, or an earlier run of this one, never matches this one.
+_STREAM_BITS = 40
+
+
+class _Opaque(bytes):
+    """
+    Frame of a notification that is not a JSON object, sent as it is and never
+    batched with other frames.
+    """
+
+
+def _is_object(payload: bytes) -> bool:
+    if not payload.startswith(b"{"):
+        return False
+    try:
+        return isinstance(listeners.json_loads(payload), dict)
+    except ValueError:
+        return False
+
+
+class Subscriber:
+    """
+    Bounded buffer of the frames waiting to be sent to one client.
+
+    When a frame arrives while `max_buffer` frames are waiting, the `overflow`
+    policy decides what gives:
+    - "drop-oldest" drops the oldest waiting frame.
+    - "invalidate" replaces all waiting frames by one synthetic `invalidate`
+        event, the client then drops everything it cached, which is always safe.
+    - "disconnect" disconnects the client, which reconnects and starts over.
+
+    Dropped and coalesced frames and disconnects are counted in `metrics`.
+    """
+
+    def __init__(
+        self,
+        channel: str,
+        max_buffer: int,
+        overflow: Overflow,
+        metrics: collections.Counter[str],
+    ) -> None:
+        if max_buffer <= 0:
+            raise ValueError("max_buffer must be greater than zero")
+
+        self.channel = channel
+        self.max_buffer = max_buffer
+        self.overflow = overflow
+        self.metrics = metrics
+        self.disconnected = False
+        self._frames = collections.deque[bytes]()
+        self._ready = asyncio.Event()
+
+    def offer(self, frame: bytes) -> None:
+        if self.disconnected:
+            return
+
+        if len(self._frames) >= self.max_buffer:
+            if self.overflow == "drop-oldest":
+                self._frames.popleft()
+                self.metrics["dropped"] += 1
+            elif self.overflow == "invalidate":
+                self.metrics["coalesced"] += len(self._frames)
+                self._frames.clear()
+                event = listeners.invalidate_event(models.PGChannel(self.channel))
+                self._frames.append(event.model_dump_json().encode())
+            else:
+                self.metrics["disconnected"] += 1
+                self.disconnected = True
+                self._frames.clear()
+                self._ready.set()
+                return
+
+        self._frames.append(frame)
+        self._ready.set()
+
+    def batch(self, first: bytes) -> bytes:
+        """
+        Packs first and the frames waiting after it into a single JSON array
+        frame. Frames are JSON objects, so this is a concatenation, not a
+        re-encoding. Opaque frames are sent on their own, batching stops at
+        the first one waiting.
+        """
+        if isinstance(first, _Opaque):
+            return first
+        frames = [first]
+        while self._frames and not isinstance(self._frames[0], _Opaque):
+            frames.append(self._frames.popleft())
+        return b"[" + b",".join(frames) + b"]"
+
+    def get_nowait(self) -> bytes:
+        """
+        Raises:
+            IndexError: If no frame is waiting.
+        """
+        return self._frames.popleft()
+
+    async def get(self) -> bytes | None:
+        """
+        Waits for the next frame, returns None once the subscriber is
+        disconnected for being too slow.
+        """
+        while not self._frames:
+            if self.disconnected:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        return self._frames.popleft()
+
+
+class Broadcaster:
+    """
+    Shares one LISTEN per channel among all WebSocket clients of the channel.
+
+    Subscribers are reference counted, the channel is listened to while it has
+    at least one. Every notification is encoded once and the same frame is
+    offered to each subscriber, whose buffer is bounded by `max_buffer` frames
+    with the `overflow` policy deciding what happens to slow clients.
+    Per channel counts of dropped and coalesced frames and of disconnects are
+    kept in `metrics`.
+
+    Each frame is stamped with a sequence number as the `seq` field of the
+    event, and the last `replay_size` frames of each channel are kept. A client
+    that reconnects with the last number it received is sent the frames it
+    missed if they are all still kept, and an `invalidate` event otherwise.
+    """
+
+    def __init__(
+        self,
+        connection: asyncpg.Connection,
+        max_buffer: int = 1_024,
+        overflow: Overflow = "invalidate",
+        replay_size: int = 1_024,
+    ) -> None:
+        self._connection = connection
+        self._subscribers = dict[str, set[Subscriber]]()
+        self.max_buffer = max_buffer
+        self.overflow: Overflow = overflow
+        self.replay_size = replay_size
+        self._stream = secrets.randbits(22)
+        self._sequence = self._stream << _STREAM_BITS
+        self._replay = dict[str, collections.deque[tuple[int, bytes]]]()
+        # First sequence number of each channel that can be replayed, events
+        # before it may have been missed while nobody listened.
+        self._replayable = dict[str, int]()
+        self.metrics = collections.defaultdict[str, collections.Counter[str]](
+            collections.Counter
+        )
+
+    def subscribers(self, channel: str) -> int:
+        return len(self._subscribers.get(channel, ()))
+
+    async def subscribe(self, channel: str, after: int | None = None) -> Subscriber:
+        """
+        Subscribes to channel. With `after`, the last sequence number the
+        client received, the frames it missed since are queued first, or an
+        `invalidate` event if they can not be replayed.
+        """
+        subscriber = Subscriber(
+            channel,
+            self.max_buffer,
+            self.overflow,
+            self.metrics[channel],
+        )
+        if (subscribers := self._subscribers.get(channel)) is None:
+            self._subscribers[channel] = subscribers = set()
+            self._replay[channel] = collections.deque(maxlen=self.replay_size)
+            # Skips a number, clients that last received one before it may
+            # have missed events while the channel was not listened to.
+            self._sequence += 1
+            self._replayable[channel] = self._sequence + 1
+            await self._connection.add_listener(channel, self._dispatch)
+        if after is not None:
+            self._resume(subscriber, after)
+        subscribers.add(subscriber)
+        return subscriber
+
+    async def unsubscribe(self, channel: str, subscriber: Subscriber) -> None:
+        if (subscribers := self._subscribers.get(channel)) is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[channel]
+            del self._replay[channel], self._replayable[channel]
+            if not self._connection.is_closed():
+                await self._connection.remove_listener(channel, self._dispatch)
+
+    def report(self) -> dict[str, dict[str, int]]:
+        return {
+            channel: {
+                "subscribers": self.subscribers(channel),
+                "dropped": self.metrics[channel]["dropped"],
+                "coalesced": self.metrics[channel]["coalesced"],
+                "disconnected": self.metrics[channel]["disconnected"],
+                "resumed": self.metrics[channel]["resumed"],
+                "invalidated": self.metrics[channel]["invalidated"],
+            }
+            for channel in sorted(set(self.metrics) | set(self._subscribers))
+        }
+
+    def _dispatch(
+        self,
+        connection: object,
+        pid: int,
+        channel: str,
+        payload: object,
+    ) -> None:
+        """
+        Queues a notification for every subscriber of its channel.
+        """
+        assert isinstance(payload, str)
+        if (replay := self._replay.get(channel)) is None:
+            return
+
+        self._sequence += 1
+        frame = payload.encode()
+        if _is_object(frame):
+            rest = frame[1:]
+            separator = b"" if rest.lstrip().startswith(b"}") else b","
+            frame = b'{"seq":%d%s' % (self._sequence, separator) + rest
+        else:
+            frame = _Opaque(frame)
+        if len(replay) == replay.maxlen:
+            evicted = replay[0][0] if replay else self._sequence
+            self._replayable[channel] = evicted + 1
+        replay.append((self._sequence, frame))
+
+        for subscriber in self._subscribers[channel]:
+            subscriber.offer(frame)
+
+    def _resume(self, subscriber: Subscriber, after: int) -> None:
+        channel = subscriber.channel
+        if (
+            after >> _STREAM_BITS == self._stream
+            and self._replayable[channel] <= after + 1 <= self._sequence + 1
+        ):
+            for sequence, frame in self._replay[channel]:
+                if sequence > after:
+                    subscriber.offer(frame)
+            self.metrics[channel]["resumed"] += 1
+        else:
+            event = listeners.invalidate_event(models.PGChannel(channel))
+            subscriber.offer(event.model_dump_json().encode())
+            self.metrics[channel]["invalidated"] += 1
+
+
+async def forward(
+    websocket: WebSocket,
+    subscriber: Subscriber,
+    linger_ms: float,
+    binary: bool = False,
+) -> None:
+    """
+    Sends the frames of subscriber to the client, batched if `linger_ms`
+    is positive, until it is disconnected for being too slow. Frames are
+    sent as text, or as they are encoded if `binary`.
+    """
+    while (frame := await subscriber.get()) is not None:
+        if linger_ms > 0:
+            await asyncio.sleep(linger_ms / 1_000)
+            frame = subscriber.batch(frame)
+        if binary:
+            await websocket.send_bytes(frame)
+        else:
+            await websocket.send_text(frame.decode())
+    # Too slow to keep up, the client should reconnect.
+    await websocket.close(code=1013)
+
+
+async def disconnected(websocket: WebSocket) -> None:
+    """
+    Returns once the client disconnects.
+    """
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
 
 
 @asynccontextmanager
@@ -21,66 +317,211 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     Manages the applications database conncetion.
     """
     app.state.pg_connection = conn = await asyncpg.connect()
+    app.state.broadcaster = Broadcaster(
+        conn,
+        app.state.max_buffer,
+        app.state.overflow,
+        app.state.replay_size,
+    )
     try:
         yield
     finally:
         await conn.close()
 
 
-def get_pg_connection(req: WebSocket) -> asyncpg.Connection:
+def get_broadcaster(req: HTTPConnection) -> Broadcaster:
     """
-    Retrieves PostgreSQL connection from app state for FastAPI endpoints.
+    Retrieves the channel broadcaster from app state for FastAPI endpoints,
+    both HTTP and WebSocket ones.
     """
     assert isinstance(
-        conn := req.app.state.pg_connection,
-        asyncpg.Connection,
+        broadcaster := req.app.state.broadcaster,
+        Broadcaster,
     )
-    return conn
+    return broadcaster
 
 
-def main() -> FastAPI:
+def main(
+    max_buffer: int = 1_024,
+    overflow: Overflow = "invalidate",
+    replay_size: int = 1_024,
+) -> FastAPI:
     """
     Configures FastAPI app with PostgreSQL connection and WebSocket
-    endpoint for PUB/SUB.
+    endpoint for PUB/SUB. Each client buffers up to `max_buffer` frames,
+    `overflow` decides what happens to clients that fall further behind.
+    The last `replay_size` frames per channel are kept for reconnecting
+    clients.
     """
 
     app = FastAPI(lifespan=lifespan)
+    app.state.max_buffer = max_buffer
+    app.state.overflow = overflow
+    app.state.replay_size = replay_size
 
     @app.get("/up")
     async def up() -> Response:
         return Response()
 
+    @app.get("/metrics")
+    async def metrics(
+        broadcaster: Broadcaster = Depends(get_broadcaster),
+    ) -> dict[str, dict[str, int]]:
+        """
+        Per channel subscriber counts and slow client counters.
+        """
+        return broadcaster.report()
+
     @app.websocket("/pgpubsub/{channel}")
     async def pubsub_proxy(
         websocket: WebSocket,
         channel: str,
-        conn: asyncpg.Connection = Depends(get_pg_connection),
+        linger_ms: float = 0,
+        after: int | None = None,
+        binary: bool = False,
+        broadcaster: Broadcaster = Depends(get_broadcaster),
     ) -> None:
         """
         Forwards messages from a PostgreSQL channel to WebSocket clients.
+
+        With `linger_ms`, messages are batched: after a message arrives, the
+        distributor waits that long and sends it along with all messages that
+        arrived meanwhile as one JSON array.
+
+        Clients reconnecting with `after`, the `seq` of the last message they
+        received, are sent the messages they missed, or an `invalidate` event
+        if those are no longer available.
+
+        Messages are text frames, or binary frames with `binary`, which saves
+        the distributor decoding them for every client.
         """
 
         await websocket.accept()
-        que = asyncio.Queue[str]()
-
-        async def putter(
-            connection: asyncpg.Connection,
-            pid: int,
-            channel: str,
-            payload: str,
-        ) -> None:
-            """
-            Enqueues message payloads for forwarding to WebSocket clients on new
-            publication.
-            """
-            await que.put(payload)
-
-        await conn.add_listener(channel, putter)  # type: ignore[arg-type]
+        subscriber = await broadcaster.subscribe(channel, after)
+
+        tasks = {
+            asyncio.create_task(forward(websocket, subscriber, linger_ms, binary)),
+            asyncio.create_task(disconnected(websocket)),
+        }
+        for task in tasks:
+            # Sending to a client that went away raises, nothing to report.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
 
         try:
-            while True:
-                await websocket.send_text(await que.get())
-        except WebSocketDisconnect:
-            await conn.remove_listener(channel, putter)  # type: ignore[arg-type]
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await broadcaster.unsubscribe(channel, subscriber)
 
     return app
+
+
+def _worker(
+    host: str,
+    port: int,
+    max_buffer: int,
+    overflow: Overflow,
+    replay_size: int,
+) -> None:
+    """
+    Serves the distributor on a socket of its own bound with SO_REUSEPORT, the
+    kernel spreads new connections over all workers bound to the port.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+
+    app = main(max_buffer, overflow, replay_size)
+    uvicorn.Server(uvicorn.Config(app, lifespan="on")).run(sockets=[sock])
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    workers: int = 0,
+    max_buffer: int = 1_024,
+    overflow: Overflow = "invalidate",
+    replay_size: int = 1_024,
+) -> None:
+    """
+    Runs the distributor in `workers` processes, one per CPU if zero, and
+    restarts workers that exit until interrupted or terminated.
+
+    Every worker holds one PostgreSQL connection and listens once per channel
+    its clients subscribed to, so the database serves `workers` listeners per
+    channel however many clients there are. Sequence numbers and replay
+    buffers are per worker, so resuming with `after` only works when a client
+    reconnects to the same worker, about one time in `workers`. Otherwise it
+    receives an `invalidate` event.
+
+    Raises:
+    - RuntimeError: If the platform does not support SO_REUSEPORT.
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("Multiple workers require SO_REUSEPORT.")
+
+    context = multiprocessing.get_context("spawn")
+    arguments = (host, port, max_buffer, overflow, replay_size)
+    processes = set[multiprocessing.process.BaseProcess]()
+    stopping = False
+
+    def stop(signum: int, frame: FrameType | None) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        while not stopping:
+            while len(processes) < (workers or os.cpu_count() or 1):
+                process = context.Process(target=_worker, args=arguments)
+                process.start()
+                processes.add(process)
+
+            multiprocessing.connection.wait(
+                [process.sentinel for process in processes],
+                timeout=1,
+            )
+            for exited in [p for p in processes if not p.is_alive()]:
+                logger.warning(
+                    "Worker %s exited with %s, restarting.",
+                    exited.pid,
+                    exited.exitcode,
+                )
+                processes.discard(exited)
+                # Workers failing on startup, such as without a database,
+                # are not restarted in a busy loop.
+                time.sleep(1)
+    finally:
+        for worker in processes:
+            worker.terminate()
+        for worker in processes:
+            worker.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="pgcachewatch.pg_event_distributor")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Number of worker processes, one per CPU if zero.",
+    )
+    parser.add_argument("--max-buffer", type=int, default=1_024)
+    parser.add_argument("--overflow", choices=get_args(Overflow), default="invalidate")
+    parser.add_argument("--replay-size", type=int, default=1_024)
+    parsed = parser.parse_args()
+    serve(
+        parsed.host,
+        parsed.port,
+        parsed.workers,
+        parsed.max_buffer,
+        parsed.overflow,
+        parsed.replay_size,
+    )
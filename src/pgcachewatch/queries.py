@@ -1,23 +1,177 @@
+def _event_object(
+    indent: str,
+    keys: str | None = None,
+    compact: bool = False,
+) -> str:
+    """
+    Returns the expression building an event payload, with `keys` the
+    expression of its keys if any. The compact format names fields by one
+    letter, gives the operation by its first letter and the time it was sent
+    in microseconds since the epoch.
+    """
+    if compact:
+        fields = [
+            "'o', lower(left(TG_OP, 1))",
+            "'t', TG_TABLE_NAME",
+            "'s', (extract(epoch FROM NOW()) * 1000000)::bigint",
+        ]
+        if keys is not None:
+            fields.append(f"'k', {keys}")
+    else:
+        fields = [
+            "'operation', lower(TG_OP)",
+            "'table', TG_TABLE_NAME",
+            "'sent_at', NOW()",
+        ]
+        if keys is not None:
+            fields.append(f"'keys', {keys}")
+    separator = f",\n{indent}  "
+    return f"json_build_object(\n{indent}  {separator.join(fields)}\n{indent})::text"
+
+
 def create_notify_function(
     channel_name: str,
     function_name: str,
+    compact: bool = False,
 ) -> str:
     return f"""
 CREATE OR REPLACE FUNCTION {function_name}() RETURNS TRIGGER AS $$
   BEGIN
     PERFORM pg_notify(
       '{channel_name}',
-      json_build_object(
-        'operation', lower(TG_OP),
-        'table', TG_TABLE_NAME,
-        'sent_at', NOW()
-      )::text);
+      {_event_object("      ", compact=compact)});
     RETURN NEW;
   END;
   $$ LANGUAGE plpgsql;
 """
 
 
+def create_row_notify_function(
+    channel_name: str,
+    function_name: str,
+    compact: bool = False,
+) -> str:
+    keys = """(
+          SELECT coalesce(json_agg(k), '[]'::json)
+          FROM (VALUES (new_key), (old_key)) AS v(k)
+          WHERE k IS NOT NULL
+        )"""
+    return f"""
+CREATE OR REPLACE FUNCTION {function_name}() RETURNS TRIGGER AS $$
+  DECLARE
+    new_key json;
+    old_key json;
+  BEGIN
+    IF TG_LEVEL = 'ROW' AND TG_OP <> 'DELETE' THEN
+      SELECT json_object_agg(col, to_json(NEW) -> col ORDER BY ord)
+        INTO new_key
+        FROM unnest(TG_ARGV) WITH ORDINALITY AS a(col, ord);
+    END IF;
+    IF TG_LEVEL = 'ROW' AND TG_OP <> 'INSERT' THEN
+      SELECT json_object_agg(col, to_json(OLD) -> col ORDER BY ord)
+        INTO old_key
+        FROM unnest(TG_ARGV) WITH ORDINALITY AS a(col, ord);
+    END IF;
+    IF old_key::text = new_key::text THEN
+      old_key := NULL;
+    END IF;
+    PERFORM pg_notify(
+      '{channel_name}',
+      {_event_object("      ", keys, compact)});
+    RETURN NEW;
+  END;
+  $$ LANGUAGE plpgsql;
+"""
+
+
+def create_batched_notify_function(
+    channel_name: str,
+    function_name: str,
+    max_keys: int,
+    max_payload_bytes: int = 7_999,
+    compact: bool = False,
+) -> str:
+    return f"""
+CREATE OR REPLACE FUNCTION {function_name}() RETURNS TRIGGER AS $$
+  DECLARE
+    keys text[] := ARRAY[]::text[];
+    batch text[] := ARRAY[]::text[];
+    budget int;
+    used int := 0;
+    key text;
+  BEGIN
+    IF TG_LEVEL = 'STATEMENT' AND TG_NARGS > 0 AND TG_OP = 'INSERT' THEN
+      SELECT coalesce(array_agg(DISTINCT k), keys) INTO keys FROM (
+        SELECT (
+          SELECT json_object_agg(col, to_json(r) -> col ORDER BY ord)
+          FROM unnest(TG_ARGV) WITH ORDINALITY AS a(col, ord)
+        )::text AS k
+        FROM new_rows r
+      ) AS s;
+    ELSIF TG_LEVEL = 'STATEMENT' AND TG_NARGS > 0 AND TG_OP = 'UPDATE' THEN
+      SELECT coalesce(array_agg(DISTINCT k), keys) INTO keys FROM (
+        SELECT (
+          SELECT json_object_agg(col, to_json(r) -> col ORDER BY ord)
+          FROM unnest(TG_ARGV) WITH ORDINALITY AS a(col, ord)
+        )::text AS k
+        FROM new_rows r
+        UNION ALL
+        SELECT (
+          SELECT json_object_agg(col, to_json(r) -> col ORDER BY ord)
+          FROM unnest(TG_ARGV) WITH ORDINALITY AS a(col, ord)
+        )::text AS k
+        FROM old_rows r
+      ) AS s;
+    ELSIF TG_LEVEL = 'STATEMENT' AND TG_NARGS > 0 AND TG_OP = 'DELETE' THEN
+      SELECT coalesce(array_agg(DISTINCT k), keys) INTO keys FROM (
+        SELECT (
+          SELECT json_object_agg(col, to_json(r) -> col ORDER BY ord)
+          FROM unnest(TG_ARGV) WITH ORDINALITY AS a(col, ord)
+        )::text AS k
+        FROM old_rows r
+      ) AS s;
+    END IF;
+
+    -- Statements that did not change any rows have nothing to invalidate.
+    IF cardinality(keys) = 0 AND TG_OP <> 'TRUNCATE' AND TG_NARGS > 0
+      AND TG_LEVEL = 'STATEMENT' THEN
+      RETURN NULL;
+    END IF;
+
+    budget := {max_payload_bytes} - octet_length(
+      {_event_object("      ", "'[]'::json", compact)}
+    );
+
+    -- Fall back to a single table wide event when the statement touched too
+    -- many rows or a key cannot fit in a payload.
+    IF cardinality(keys) > {max_keys}
+      OR EXISTS (SELECT 1 FROM unnest(keys) AS k WHERE octet_length(k) >= budget) THEN
+      keys := ARRAY[]::text[];
+    END IF;
+
+    FOREACH key IN ARRAY keys LOOP
+      IF used + octet_length(key) + 1 > budget THEN
+        PERFORM pg_notify(
+          '{channel_name}',
+          {_event_object("          ", "array_to_json(batch::json[])", compact)});
+        batch := ARRAY[]::text[];
+        used := 0;
+      END IF;
+      batch := batch || key;
+      used := used + octet_length(key) + 1;
+    END LOOP;
+
+    IF cardinality(batch) > 0 OR cardinality(keys) = 0 THEN
+      PERFORM pg_notify(
+        '{channel_name}',
+        {_event_object("        ", "array_to_json(batch::json[])", compact)});
+    END IF;
+    RETURN NULL;
+  END;
+  $$ LANGUAGE plpgsql;
+"""
+
+
 def create_after_change_trigger(
     trigger_name: str,
     table_name: str,
@@ -30,15 +184,74 @@ CREATE OR REPLACE TRIGGER {trigger_name}
 """
 
 
+def create_after_change_row_trigger(
+    trigger_name: str,
+    table_name: str,
+    function_name: str,
+    key_columns: list[str],
+) -> str:
+    arguments = ", ".join(f"'{column}'" for column in key_columns)
+    return f"""
+CREATE OR REPLACE TRIGGER {trigger_name}
+  AFTER INSERT OR UPDATE OR DELETE ON {table_name}
+  FOR EACH ROW EXECUTE FUNCTION {function_name}({arguments});
+CREATE OR REPLACE TRIGGER {trigger_name}_truncate
+  AFTER TRUNCATE ON {table_name}
+  EXECUTE FUNCTION {function_name}();
+"""
+
+
+def create_after_change_batched_trigger(
+    trigger_name: str,
+    table_name: str,
+    function_name: str,
+    key_columns: list[str],
+) -> str:
+    arguments = ", ".join(f"'{column}'" for column in key_columns)
+    return f"""
+CREATE OR REPLACE TRIGGER {trigger_name}_insert
+  AFTER INSERT ON {table_name}
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION {function_name}({arguments});
+CREATE OR REPLACE TRIGGER {trigger_name}_update
+  AFTER UPDATE ON {table_name}
+  REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION {function_name}({arguments});
+CREATE OR REPLACE TRIGGER {trigger_name}_delete
+  AFTER DELETE ON {table_name}
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION {function_name}({arguments});
+CREATE OR REPLACE TRIGGER {trigger_name}_truncate
+  AFTER TRUNCATE ON {table_name}
+  EXECUTE FUNCTION {function_name}();
+"""
+
+
+def fetch_primary_key_columns() -> str:
+    return """
+SELECT
+  a.attname AS column_name
+FROM
+  pg_index i
+  JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+WHERE
+  i.indrelid = $1::regclass AND i.indisprimary
+ORDER BY
+  array_position(i.indkey::int2[], a.attnum)
+"""
+
+
 def fetch_trigger_names(prefix: str) -> str:
+    # pg_trigger rather than information_schema.triggers, which leaves out
+    # TRUNCATE triggers.
     return f"""
 SELECT
-  event_object_table AS table,
-  trigger_name
+  tgrelid::regclass::text AS table,
+  tgname AS trigger_name
 FROM
-  information_schema.triggers
+  pg_trigger
 WHERE
-  trigger_name LIKE '{prefix}%'
+  NOT tgisinternal AND tgname LIKE '{prefix}%'
 """
 
 
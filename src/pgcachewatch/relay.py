@@ -0,0 +1,141 @@
+"""
+Relays events from one listener to sibling worker processes on the same host
+over a Unix domain socket. With N workers, a single process holds the
+PostgreSQL connection and parses each notification, the workers receive events
+through `listeners.UnixEventQueue`.
+
+Usage example:
+```python
+listener = listeners.PGEventQueue()
+await listener.connect_forever(dsn, channel)
+async with relay.UnixEventRelay(listener, "/run/pgcachewatch.sock"):
+    ...
+```
+"""
+
+import asyncio
+import contextlib
+import datetime
+import os
+from types import TracebackType
+
+from . import listeners, models
+from .logconfig import logger
+
+# Receivers know their channel and stamp their own arrival time.
+_NOT_RELAYED = {"channel", "received_at"}
+
+
+def encode_event(event: models.Event) -> bytes:
+    """
+    Encodes an event as one line of JSON, the relay wire format.
+    """
+    return event.model_dump_json(exclude=_NOT_RELAYED).encode() + b"\n"
+
+
+class UnixEventRelay:
+    """
+    Serves the events of a source listener to any number of clients on a Unix
+    domain socket.
+
+    Every event is encoded once and written to all clients. Clients whose
+    unsent data exceeds `max_buffer_bytes` are disconnected, rather than
+    holding up the others or growing memory without bound. While the source
+    is unhealthy clients are disconnected and new ones refused, so their
+    caches are bypassed as if they listened themselves.
+    """
+
+    def __init__(
+        self,
+        source: listeners.EventQueueProtocol,
+        path: str,
+        max_buffer_bytes: int = 1024**2,
+        health_check_interval: datetime.timedelta = datetime.timedelta(seconds=1),
+    ) -> None:
+        self._source = source
+        self._path = path
+        self._max_buffer_bytes = max_buffer_bytes
+        self._health_check_interval = health_check_interval
+        self._clients = set[asyncio.StreamWriter]()
+        self._server: asyncio.AbstractServer | None = None
+        self._pump_task: asyncio.Task[None] | None = None
+
+    @property
+    def clients(self) -> int:
+        return len(self._clients)
+
+    async def start(self) -> None:
+        if self._server is not None:
+            raise RuntimeError("UnixEventRelay instance is already started.")
+
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self._path)
+        self._server = await asyncio.start_unix_server(self._accept, self._path)
+        self._pump_task = asyncio.create_task(self._pump())
+
+    async def close(self) -> None:
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+            self._pump_task = None
+        for writer in list(self._clients):
+            self._disconnect(writer)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "UnixEventRelay":
+        await self.start()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        await self.close()
+
+    async def _accept(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        if not self._source.connection_healthy():
+            writer.close()
+            return
+        writer.write(listeners.RELAY_GREETING)
+        self._clients.add(writer)
+
+    def _disconnect(self, writer: asyncio.StreamWriter) -> None:
+        self._clients.discard(writer)
+        writer.close()
+
+    def _broadcast(self, frame: bytes) -> None:
+        for writer in list(self._clients):
+            if writer.is_closing():
+                self._clients.discard(writer)
+            elif writer.transport.get_write_buffer_size() > self._max_buffer_bytes:
+                logger.warning("Relay client too slow, disconnecting.")
+                self._disconnect(writer)
+            else:
+                writer.write(frame)
+
+    async def _pump(self) -> None:
+        while True:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    listeners.wait_for_events(self._source),
+                    self._health_check_interval.total_seconds(),
+                )
+
+            if not self._source.connection_healthy():
+                for writer in list(self._clients):
+                    self._disconnect(writer)
+
+            while True:
+                try:
+                    event = self._source.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                self._broadcast(encode_event(event))
@@ -0,0 +1,158 @@
+import functools
+import io
+import pickle
+import struct
+from typing import Any, Iterator, Protocol, TypeVar
+
+import asyncpg
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+T = TypeVar("T")
+
+_COUNT = struct.Struct("<I")
+_LENGTH = struct.Struct("<Q")
+
+
+class Codec(Protocol[T]):
+    """
+    Protocol for the codecs turning cached values into bytes and back, used to
+    store values outside the Python heap and to measure their size.
+    """
+
+    def dumps(self, value: T) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes | memoryview) -> T:
+        """
+        Decodes data, which may be a view of shared memory that must not be
+        written to.
+        """
+        raise NotImplementedError
+
+
+class PickleCodec(Codec[Any]):
+    """
+    Pickles values with protocol 5, keeping buffers such as numpy arrays out of
+    band. Decoding from a memoryview hands those buffers out as views of the
+    encoded data instead of copies, so large arrays cost no copy per hit.
+    """
+
+    def dumps(self, value: Any) -> bytes:
+        buffers = list[pickle.PickleBuffer]()
+        frames: list[bytes | memoryview] = [self._pickle(value, buffers.append)]
+        frames.extend(buffer.raw() for buffer in buffers)
+
+        header = bytearray(_COUNT.pack(len(frames)))
+        for frame in frames:
+            header += _LENGTH.pack(len(frame))
+        return b"".join((header, *frames))
+
+    def loads(self, data: bytes | memoryview) -> Any:
+        view = memoryview(data)
+        (count,) = _COUNT.unpack_from(view)
+        offset = _COUNT.size + count * _LENGTH.size
+
+        frames = list[memoryview]()
+        for n in range(count):
+            (length,) = _LENGTH.unpack_from(view, _COUNT.size + n * _LENGTH.size)
+            frames.append(view[offset : offset + length])
+            offset += length
+        return pickle.loads(frames[0], buffers=frames[1:])
+
+    def _pickle(self, value: Any, buffer_callback: Any) -> bytes:
+        return pickle.dumps(value, protocol=5, buffer_callback=buffer_callback)
+
+
+class Row(tuple):
+    """
+    Read-only stand-in for `asyncpg.Record`, which can not be pickled. Supports
+    lookups by index and column name, `get`, `keys`, `values` and `items`.
+    """
+
+    _index: dict[str, int] = {}
+
+    def __getitem__(self, key: Any) -> Any:
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def values(self) -> Iterator[Any]:
+        return tuple.__iter__(self)
+
+    def items(self) -> Iterator[tuple[str, Any]]:
+        return zip(self._index, self)
+
+    def __repr__(self) -> str:
+        fields = " ".join(f"{key}={value!r}" for key, value in self.items())
+        return f"<Row {fields}>"
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return _make_row, (tuple(self._index), tuple(self))
+
+
+@functools.lru_cache(maxsize=1_024)
+def _row_type(columns: tuple[str, ...]) -> type[Row]:
+    return type("Row", (Row,), {"_index": {c: n for n, c in enumerate(columns)}})
+
+
+def _make_row(columns: tuple[str, ...], values: tuple[Any, ...]) -> Row:
+    return _row_type(columns)(values)
+
+
+class _RecordPickler(pickle.Pickler):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # One tuple object per distinct set of columns, pickle's memo then
+        # writes the column names once instead of once per record.
+        self._columns = dict[tuple[str, ...], tuple[str, ...]]()
+
+    def reducer_override(self, obj: Any) -> Any:
+        if not isinstance(obj, asyncpg.Record):
+            return NotImplemented
+        columns = tuple(obj.keys())
+        columns = self._columns.setdefault(columns, columns)
+        return _make_row, (columns, tuple(obj.values()))
+
+
+class RecordCodec(PickleCodec):
+    """
+    `PickleCodec` that also encodes `asyncpg.Record`s, anywhere in the value,
+    storing the column names once per query shape rather than once per
+    record. Records are decoded as `Row`s.
+    """
+
+    def _pickle(self, value: Any, buffer_callback: Any) -> bytes:
+        file = io.BytesIO()
+        _RecordPickler(file, protocol=5, buffer_callback=buffer_callback).dump(value)
+        return file.getvalue()
+
+
+class MsgpackCodec(Codec[Any]):
+    """
+    Encodes values with msgpack, compact and fast but limited to plain data:
+    dicts, lists, strings, bytes, numbers, booleans and None. Tuples are
+    decoded as lists. Requires the `msgpack` extra.
+    """
+
+    def __init__(self) -> None:
+        if msgpack is None:
+            raise ImportError("MsgpackCodec requires msgpack, pip install msgpack")
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes | memoryview) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
@@ -0,0 +1,207 @@
+import contextlib
+import hashlib
+import mmap
+import os
+import pickle
+import secrets
+import struct
+import tempfile
+from typing import Hashable, Protocol, TypeVar
+
+T = TypeVar("T")
+
+_GENERATION = struct.Struct("<Q")
+
+
+class Storage(Protocol[T]):
+    """
+    Protocol for the stores holding the computed values of a cached function.
+
+    A `shared` storage is visible to other processes, every process applying
+    the invalidations it receives to it. Bookkeeping such as tag indexes,
+    eviction policies and expiry times only knows the entries computed by its
+    own process, so it is not available with shared storages.
+    """
+
+    shared: bool
+
+    def get(self, key: Hashable) -> T:
+        """
+        Returns the value stored under key.
+
+        Raises:
+            KeyError: If no value is stored under key.
+        """
+        raise NotImplementedError
+
+    def set(self, key: Hashable, value: T, generation: int | None = None) -> None:
+        """
+        Stores value under key. With a generation, taken by `generation` when
+        the value started being computed, the value is dropped if the storage
+        was cleared since.
+        """
+        raise NotImplementedError
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Removes the value stored under key, if any.
+        """
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def generation(self) -> int:
+        """
+        Returns an identifier of the current generation of entries, which
+        changes whenever the storage is cleared, by any process sharing it.
+        """
+        raise NotImplementedError
+
+
+class MemoryStorage(Storage[T]):
+    """
+    Keeps values in a dict of the current process, the default storage.
+    """
+
+    shared = False
+
+    def __init__(self) -> None:
+        self._values = dict[Hashable, T]()
+        self._generation = 0
+
+    def get(self, key: Hashable) -> T:
+        return self._values[key]
+
+    def set(self, key: Hashable, value: T, generation: int | None = None) -> None:
+        if generation is None or generation == self._generation:
+            self._values[key] = value
+
+    def delete(self, key: Hashable) -> None:
+        self._values.pop(key, None)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._values.clear()
+
+    def generation(self) -> int:
+        return self._generation
+
+
+class SharedMemoryStorage(Storage[bytes | mmap.mmap]):
+    """
+    Keeps encoded values in memory mapped files shared by all processes on the
+    host, so a value computed by one worker is a hit for all others.
+
+    Values are stored once per host, in one file per entry under `directory`
+    (a tmpfs such as /dev/shm keeps them in memory), and handed out as views of
+    the mapped pages, decoding reads them without copying them first. Files
+    are replaced atomically, readers never see a partially written value.
+
+    Clearing switches all processes to a new random generation that entries
+    are filed under, which takes constant time and never loses a concurrent
+    clear, after which files of older generations are removed. Keys must
+    pickle identically in every process, which holds for the common argument
+    types (numbers, strings, tuples of those and so on) but not for sets.
+
+    The storage has no size bound of its own, as counting the entries of all
+    processes would take a lock shared by them on every write. The tmpfs is
+    the bound, values that do not fit raise `OSError` and are not cached.
+
+    Each cached function needs a storage of its own, `name` identifies it
+    across processes:
+    ```python
+    @decorators.cache(
+        strategy=strategy,
+        storage=functools.partial(storage.SharedMemoryStorage, "fetch_orders"),
+    )
+    async def fetch_orders(user_id: int) -> list: ...
+    ```
+    """
+
+    shared = True
+
+    def __init__(self, name: str, directory: str = "/dev/shm") -> None:
+        self._path = os.path.join(directory, f"pgcachewatch-{name}")
+        os.makedirs(self._path, exist_ok=True)
+
+        fd = os.open(os.path.join(self._path, "generation"), os.O_RDWR | os.O_CREAT)
+        try:
+            if os.fstat(fd).st_size < _GENERATION.size:
+                os.ftruncate(fd, _GENERATION.size)
+            self._generation = mmap.mmap(fd, _GENERATION.size)
+        finally:
+            os.close(fd)
+
+    def get(self, key: Hashable) -> mmap.mmap:
+        try:
+            fd = os.open(self._file(key), os.O_RDONLY)
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+        # The mapping outlives the descriptor and is unmapped once no decoded
+        # value refers to it anymore.
+        try:
+            return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+    def set(
+        self,
+        key: Hashable,
+        value: bytes | mmap.mmap,
+        generation: int | None = None,
+    ) -> None:
+        if generation is None:
+            generation = self.generation()
+        elif generation != self.generation():
+            # Computed before another process cleared the storage, stale.
+            return
+
+        fd, temporary = tempfile.mkstemp(dir=self._path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(value)
+            # Filed under the generation it was computed in, should a clear
+            # happen meanwhile the value is out of sight and removed by the
+            # next clear.
+            os.replace(temporary, self._file(key, generation))
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(temporary)
+            raise
+
+    def delete(self, key: Hashable) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self._file(key))
+
+    def clear(self) -> None:
+        _GENERATION.pack_into(self._generation, 0, secrets.randbits(64))
+
+        prefix = self._prefix()
+        for entry in os.scandir(self._path):
+            if entry.name.endswith(".tmp") or entry.name == "generation":
+                continue
+            if not entry.name.startswith(prefix):
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(entry.path)
+
+    def generation(self) -> int:
+        (generation,) = _GENERATION.unpack_from(self._generation)
+        return generation
+
+    def close(self) -> None:
+        self._generation.close()
+
+    def _prefix(self, generation: int | None = None) -> str:
+        if generation is None:
+            generation = self.generation()
+        return f"{generation:016x}-"
+
+    def _file(self, key: Hashable, generation: int | None = None) -> str:
+        # functools' keys are lists carrying a per-process hash, only their
+        # items identify the call.
+        if isinstance(key, list):
+            key = tuple(key)
+        digest = hashlib.blake2b(pickle.dumps(key), digest_size=16).hexdigest()
+        return os.path.join(self._path, self._prefix(generation) + digest)
@@ -1,9 +1,11 @@
 import collections
 import datetime
-from typing import Callable, Protocol
+from typing import Callable, Hashable, Iterable, Protocol, runtime_checkable
 
 from . import listeners, models, utils
 
+Tag = tuple[Hashable, ...]
+
 
 class Strategy(Protocol):
     """
@@ -16,6 +18,35 @@ class Strategy(Protocol):
     def connection_healthy(self) -> bool:
         raise NotImplementedError
 
+    async def wait(self) -> None:
+        """
+        Returns once there may be events for `clear` to consume.
+        """
+        raise NotImplementedError
+
+
+@runtime_checkable
+class TargetedStrategy(Strategy, Protocol):
+    """
+    A protocol for strategies that, besides signaling a full clear, can name the
+    tags affected by the events they have consumed.
+    """
+
+    def affected(self) -> set[Tag]:
+        raise NotImplementedError
+
+
+def event_tags(event: models.Event) -> Iterable[Tag] | None:
+    """
+    Tags an event by the rows it carries keys for, or by its table when it has
+    no keys. `None` requests a full clear.
+    """
+    if event.operation == "invalidate":
+        return None
+    if event.keys:
+        return [(event.table, *key.values()) for key in event.keys]
+    return ((event.table,),)
+
 
 class Greedy(Strategy):
     """
@@ -36,12 +67,15 @@ class Greedy(Strategy):
     def connection_healthy(self) -> bool:
         return self._listener.connection_healthy()
 
+    async def wait(self) -> None:
+        await listeners.wait_for_events(self._listener)
+
     def clear(self) -> bool:
         for current in utils.pick_until_deadline(
             self._listener,
             settings=self._settings,
         ):
-            if self._predicate(current):
+            if current.operation == "invalidate" or self._predicate(current):
                 return True
         return False
 
@@ -67,11 +101,17 @@ class Windowed(Strategy):
     def connection_healthy(self) -> bool:
         return self._listener.connection_healthy()
 
+    async def wait(self) -> None:
+        await listeners.wait_for_events(self._listener)
+
     def clear(self) -> bool:
         for current in utils.pick_until_deadline(
             self._listener,
             settings=self._settings,
         ):
+            if current.operation == "invalidate":
+                self._events.clear()
+                return True
             self._events.append(current.operation)
             if self._window == self._events:
                 return True
@@ -98,12 +138,62 @@ class Timed(Strategy):
     def connection_healthy(self) -> bool:
         return self._listener.connection_healthy()
 
+    async def wait(self) -> None:
+        await listeners.wait_for_events(self._listener)
+
     def clear(self) -> bool:
         for current in utils.pick_until_deadline(
             queue=self._listener,
             settings=self._settings,
         ):
-            if current.sent_at - self._previous > self._timedelta:
+            if (
+                current.operation == "invalidate"
+                or current.sent_at - self._previous > self._timedelta
+            ):
                 self._previous = current.sent_at
                 return True
         return False
+
+
+class Targeted(TargetedStrategy):
+    """
+    A strategy that collects the tags of incoming events so that only the cache
+    entries depending on them are invalidated, instead of the whole cache.
+
+    Tags are tuples ordered from coarse to fine, e.g. `("users",)` for a table and
+    `("users", 42)` for a row of it. A tag affects every tag it is a prefix of,
+    and every tag that is a prefix of it.
+    """
+
+    def __init__(
+        self,
+        listener: listeners.EventQueueProtocol,
+        settings: models.DeadlineSetting = models.DeadlineSetting(),
+        tagger: Callable[[models.Event], Iterable[Tag] | None] = event_tags,
+    ) -> None:
+        super().__init__()
+        self._listener = listener
+        self._settings = settings
+        self._tagger = tagger
+        self._affected = set[Tag]()
+
+    def connection_healthy(self) -> bool:
+        return self._listener.connection_healthy()
+
+    async def wait(self) -> None:
+        await listeners.wait_for_events(self._listener)
+
+    def clear(self) -> bool:
+        for current in utils.pick_until_deadline(
+            self._listener,
+            settings=self._settings,
+        ):
+            if (tags := self._tagger(current)) is None:
+                self._affected.clear()
+                return True
+            self._affected.update(tags)
+        return False
+
+    def affected(self) -> set[Tag]:
+        affected, self._affected = self._affected, set[Tag]()
+        return affected
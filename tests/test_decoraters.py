@@ -1,11 +1,26 @@
 import asyncio
 import collections
+import concurrent.futures
 import datetime
-from typing import NoReturn
+import functools
+import gc
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, NoReturn
 
 import asyncpg
 import pytest
-from pgcachewatch import decorators, listeners, models, strategies
+from pgcachewatch import (
+    decorators,
+    eviction,
+    listeners,
+    models,
+    serialization,
+    storage,
+    strategies,
+    utils,
+)
 
 
 @pytest.mark.parametrize("N", (1, 2, 4, 16, 64))
@@ -126,3 +141,716 @@ async def test_greedy_cache_sleepy(
     assert len(set(results)) == 1
     assert statistics["miss"] == 1
     assert statistics["hit"] == N - 1
+
+
+@pytest.mark.parametrize("N", (1, 2, 4, 16, 64))
+async def test_targeted_cache_decorator(
+    N: int,
+    pgconn: asyncpg.Connection,
+) -> None:
+    channel = models.PGChannel("test_targeted_cache_decorator")
+    statistics = collections.Counter[str]()
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn, channel)
+
+    @decorators.cache(
+        strategy=strategies.Targeted(listener=listener),
+        statistics_callback=lambda x: statistics.update([x]),
+        tags=lambda x: [(f"table_{x % 2}",)],
+    )
+    async def identity(x: int) -> int:
+        return x
+
+    await asyncio.gather(*[identity(n) for n in range(N)])
+    assert statistics["miss"] == N
+
+    await listener.put(
+        models.Event(
+            channel=channel,
+            operation="update",
+            sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+            table="table_0",
+        )
+    )
+    await asyncio.gather(*[identity(n) for n in range(N)])
+
+    # Only the entries tagged with the updated table are recomputed.
+    assert statistics["miss"] == N + len(range(0, N, 2))
+    assert statistics["hit"] == N - len(range(0, N, 2))
+
+
+@pytest.mark.parametrize("max_entries", (1, 4, 16))
+@pytest.mark.parametrize("policy", (eviction.LRU, eviction.LFU))
+async def test_bounded_cache_decorator(
+    max_entries: int,
+    policy: Callable[[], eviction.EvictionPolicy],
+    pgconn: asyncpg.Connection,
+) -> None:
+    statistics = collections.Counter[str]()
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn, models.PGChannel("test_bounded_cache_decorator"))
+
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        statistics_callback=lambda x: statistics.update([x]),
+        max_entries=max_entries,
+        policy=policy,
+    )
+    async def identity(x: int) -> int:
+        return x
+
+    for n in range(max_entries * 2):
+        assert await identity(n) == n
+
+    assert statistics["miss"] == max_entries * 2
+    assert statistics["evict"] == max_entries
+
+    # The most recent entries are still cached.
+    for n in range(max_entries, max_entries * 2):
+        assert await identity(n) == n
+    assert statistics["hit"] == max_entries
+
+
+async def test_bounded_cache_decorator_max_bytes(pgconn: asyncpg.Connection) -> None:
+    statistics = collections.Counter[str]()
+    listener = listeners.PGEventQueue()
+    await listener.connect(
+        pgconn,
+        models.PGChannel("test_bounded_cache_decorator_max_bytes"),
+    )
+
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        statistics_callback=lambda x: statistics.update([x]),
+        max_bytes=100,
+        sizeof=len,
+    )
+    async def blob(size: int) -> bytes:
+        return b"x" * size
+
+    await blob(60)
+    await blob(30)
+    assert statistics["evict"] == 0
+
+    await blob(50)
+    assert statistics["evict"] == 1
+
+    # Larger than the whole budget, never cached.
+    await blob(200)
+    await blob(200)
+    assert statistics["miss"] == 5
+
+
+async def test_ttl_cache_decorator(pgconn: asyncpg.Connection) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn, models.PGChannel("test_ttl_cache_decorator"))
+
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        ttl=datetime.timedelta(milliseconds=50),
+    )
+    async def now() -> datetime.datetime:
+        return datetime.datetime.now()
+
+    first = await now()
+    assert await now() == first
+
+    await asyncio.sleep(0.1)
+    assert await now() != first
+
+
+@pytest.mark.parametrize("N", (1, 2, 4, 16, 64))
+async def test_stale_while_revalidate_cache_decorator(
+    N: int,
+    pgconn: asyncpg.Connection,
+) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(
+        pgconn,
+        models.PGChannel("test_stale_while_revalidate_cache_decorator"),
+    )
+    calls = 0
+
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        ttl=datetime.timedelta(milliseconds=50),
+        stale_while_revalidate=datetime.timedelta(seconds=1),
+    )
+    async def counter() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    assert await counter() == 1
+    await asyncio.sleep(0.1)
+
+    # Expired entries are served immediately, refreshed once in the background.
+    assert await asyncio.gather(*[counter() for _ in range(N)]) == [1] * N
+    await asyncio.sleep(0.05)
+    assert await counter() == 2
+    assert calls == 2
+
+
+@pytest.mark.parametrize("N", (1, 2, 4, 16, 64))
+async def test_background_cache_decorator(
+    N: int,
+    pgconn: asyncpg.Connection,
+) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn, models.PGChannel("test_background_cache_decorator"))
+
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        background=True,
+    )
+    async def now() -> datetime.datetime:
+        return datetime.datetime.now()
+
+    first = await now()
+    assert await now() == first
+
+    for _ in range(N):
+        listener.put_nowait(
+            models.Event(
+                channel=models.PGChannel("test_background_cache_decorator"),
+                operation="insert",
+                sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+                table="<placeholder>",
+            )
+        )
+
+    # Events are consumed without the cache being called.
+    await asyncio.sleep(0.01)
+    assert listener.qsize() == 0
+    assert await now() != first
+
+    # The task stops with the cached function.
+    tasks = asyncio.all_tasks()
+    del now
+    gc.collect()
+    await asyncio.sleep(0.01)
+    assert len(asyncio.all_tasks()) < len(tasks)
+
+
+async def test_shared_storage_cache_decorator(
+    pgconn: asyncpg.Connection,
+    tmp_path: Path,
+) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(
+        pgconn,
+        models.PGChannel("test_shared_storage_cache_decorator"),
+    )
+    shared = functools.partial(storage.SharedMemoryStorage, "now", str(tmp_path))
+    calls = 0
+
+    # Stands in for the same function in two worker processes.
+    def worker() -> Callable[[], Awaitable[int]]:
+        @decorators.cache(
+            strategy=strategies.Greedy(listener=listener),
+            storage=shared,
+        )
+        async def counter() -> int:
+            nonlocal calls
+            calls += 1
+            return calls
+
+        return counter
+
+    first, second = worker(), worker()
+    assert await first() == 1
+    assert await second() == 1
+
+    listener.put_nowait(
+        models.Event(
+            channel=models.PGChannel("test_shared_storage_cache_decorator"),
+            operation="insert",
+            sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+            table="<placeholder>",
+        )
+    )
+    assert await second() == 2
+    assert await first() == 2
+
+    with pytest.raises(ValueError):
+        decorators.cache(
+            strategy=strategies.Greedy(listener=listener),
+            storage=shared,
+            max_entries=1,
+        )(first)
+
+
+async def test_shared_storage_cache_decorator_records(
+    pgconn: asyncpg.Connection,
+    tmp_path: Path,
+) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(
+        pgconn,
+        models.PGChannel("test_shared_storage_cache_decorator_records"),
+    )
+    calls = 0
+
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        storage=functools.partial(
+            storage.SharedMemoryStorage, "records", str(tmp_path)
+        ),
+    )
+    async def fetch() -> list[asyncpg.Record]:
+        nonlocal calls
+        calls += 1
+        return await pgconn.fetch("SELECT 1 AS one")
+
+    assert [row["one"] for row in await fetch()] == [1]
+    assert [row["one"] for row in await fetch()] == [1]
+    assert calls == 1
+
+
+async def test_cache_decorator_store_failure(pgconn: asyncpg.Connection) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(
+        pgconn,
+        models.PGChannel("test_cache_decorator_store_failure"),
+    )
+    calls = 0
+
+    class FailingCodec(serialization.PickleCodec):
+        def dumps(self, value: Any) -> bytes:
+            raise ValueError("can not encode")
+
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        codec=FailingCodec(),
+    )
+    async def counter() -> int:
+        nonlocal calls
+        calls += 1
+        return calls
+
+    # Values that can not be stored are returned, just not cached.
+    assert await counter() == 1
+    assert await counter() == 2
+
+
+async def test_codec_cache_decorator(pgconn: asyncpg.Connection) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn, models.PGChannel("test_codec_cache_decorator"))
+    codec = serialization.PickleCodec()
+    statistics = collections.Counter[str]()
+
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        statistics_callback=lambda x: statistics.update([x]),
+        max_bytes=2 * len(codec.dumps("x" * 1_000)),
+        codec=codec,
+    )
+    async def padded(n: int) -> str:
+        return str(n) * 1_000
+
+    # Values are decoded copies, sized by their encoding.
+    assert await padded(1) == "1" * 1_000
+    assert await padded(1) == "1" * 1_000
+    assert await padded(2) == "2" * 1_000
+    assert statistics["evict"] == 0
+    assert await padded(3) == "3" * 1_000
+    assert statistics["evict"] == 1
+
+
+async def test_cache_keys(pgconn: asyncpg.Connection) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn, models.PGChannel("test_cache_keys"))
+    statistics = collections.Counter[str]()
+
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        statistics_callback=lambda x: statistics.update([x]),
+    )
+    async def fetch(user_id: int, limit: int = 10, *, active: bool = True) -> int:
+        return user_id
+
+    # Positional, keyword and default arguments bind to the same key.
+    await fetch(1)
+    await fetch(user_id=1)
+    await fetch(1, 10)
+    await fetch(1, limit=10, active=True)
+    assert statistics == {"miss": 1, "hit": 3}
+
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        statistics_callback=lambda x: statistics.update([x]),
+        key=["user_id"],
+    )
+    async def fetch_with(user_id: int, conn: object) -> int:
+        return user_id
+
+    statistics.clear()
+    await fetch_with(1, object())
+    await fetch_with(1, conn=object())
+    assert statistics == {"miss": 1, "hit": 1}
+
+    # A single name is not split into the letters of it.
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        statistics_callback=lambda x: statistics.update([x]),
+        key="user_id",
+    )
+    async def fetch_named(user_id: int, conn: object) -> int:
+        return user_id
+
+    statistics.clear()
+    await fetch_named(1, object())
+    await fetch_named(1, conn=object())
+    assert statistics == {"miss": 1, "hit": 1}
+
+    with pytest.raises(ValueError):
+        decorators.cache(
+            strategy=strategies.Greedy(listener=listener),
+            key=["missing"],
+        )(fetch_with)
+
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        statistics_callback=lambda x: statistics.update([x]),
+    )
+    async def fetch_many(
+        user_ids: list[int] = [],
+        _key_kwargs: int = 0,
+        _key_default_1: int = 0,
+    ) -> int:
+        return len(user_ids) + _key_kwargs + _key_default_1
+
+    # Unhashable defaults and parameters named like the builder's helpers.
+    statistics.clear()
+    assert await fetch_many() == 0
+    assert await fetch_many(_key_kwargs=1) == 1
+    assert await fetch_many(_key_kwargs=1) == 1
+    assert statistics == {"miss": 2, "hit": 1}
+
+
+@pytest.mark.parametrize("N", (1, 2, 4, 16, 64))
+async def test_sync_cache_decorator(
+    N: int,
+    pgconn: asyncpg.Connection,
+    pgpool: asyncpg.Pool,
+) -> None:
+    channel = models.PGChannel("test_sync_cache_decorator")
+    statistics = collections.Counter[str]()
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn, channel)
+    started = threading.Barrier(min(N, 16))
+    calls = 0
+
+    @decorators.sync_cache(
+        strategy=strategies.Greedy(listener=listener),
+        statistics_callback=lambda x: statistics.update([x]),
+    )
+    def now() -> datetime.datetime:
+        nonlocal calls
+        calls += 1
+        time.sleep(0.05)
+        return datetime.datetime.now()
+
+    def call() -> datetime.datetime:
+        started.wait()
+        return now()
+
+    # Threads asking for the same key wait for a single computation.
+    with concurrent.futures.ThreadPoolExecutor(min(N, 16)) as pool:
+        nows = set(pool.map(lambda _: call(), range(N)))
+    assert len(nows) == 1
+    assert calls == 1
+    assert statistics["hit"] == N - 1
+    assert statistics["miss"] == 1
+
+    await utils.emit_event(
+        pgpool,
+        models.Event(
+            channel=channel,
+            operation="insert",
+            sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+            table="placeholder",
+        ),
+    )
+    await asyncio.sleep(0.1)
+
+    # Events received on the event loop invalidate the cache of the threads.
+    assert await asyncio.to_thread(now) not in nows
+    assert calls == 2
+
+
+async def test_sync_cache_decorator_exceptions(pgconn: asyncpg.Connection) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(
+        pgconn,
+        models.PGChannel("test_sync_cache_decorator_exceptions"),
+    )
+    started = threading.Barrier(8)
+
+    @decorators.sync_cache(strategy=strategies.Greedy(listener=listener))
+    def raise_runtime_error() -> NoReturn:
+        time.sleep(0.05)
+        raise RuntimeError
+
+    def call() -> BaseException | None:
+        started.wait()
+        try:
+            raise_runtime_error()
+        except RuntimeError as e:
+            return e
+        return None
+
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        exceptions = list(pool.map(lambda _: call(), range(8)))
+    assert all(isinstance(exc, RuntimeError) for exc in exceptions)
+
+
+@pytest.mark.parametrize("shards", (1, 4, 16))
+async def test_sync_cache_decorator_shards(
+    shards: int,
+    pgconn: asyncpg.Connection,
+) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(
+        pgconn,
+        models.PGChannel("test_sync_cache_decorator_shards"),
+    )
+    statistics = collections.Counter[str]()
+    calls = collections.Counter[int]()
+
+    @decorators.sync_cache(
+        strategy=strategies.Greedy(listener=listener),
+        statistics_callback=lambda x: statistics.update([x]),
+        shards=shards,
+    )
+    def square(n: int) -> int:
+        calls[n] += 1
+        return n * n
+
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        for _ in range(4):
+            assert list(pool.map(square, range(256))) == [n * n for n in range(256)]
+    assert set(calls.values()) == {1}
+    assert statistics["miss"] == 256
+
+    @decorators.sync_cache(
+        strategy=strategies.Greedy(listener=listener),
+        statistics_callback=lambda x: statistics.update([x]),
+        max_entries=20,
+        shards=shards,
+    )
+    def bounded(n: int) -> int:
+        return n
+
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        list(pool.map(bounded, range(256)))
+    # Every shard holds its part of the bound, the parts add up to it.
+    assert statistics["evict"] == 256 - 20
+
+
+async def test_sync_cache_decorator_store_failure(
+    pgconn: asyncpg.Connection,
+) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(
+        pgconn,
+        models.PGChannel("test_sync_cache_decorator_store_failure"),
+    )
+    started = threading.Barrier(2)
+
+    class FailingCodec(serialization.PickleCodec):
+        def dumps(self, value: Any) -> bytes:
+            raise ValueError("can not encode")
+
+    @decorators.sync_cache(
+        strategy=strategies.Greedy(listener=listener),
+        codec=FailingCodec(),
+    )
+    def slow() -> int:
+        time.sleep(0.05)
+        return 1
+
+    def call() -> int:
+        started.wait()
+        return slow()
+
+    # Both the computing and the waiting thread get the value.
+    with concurrent.futures.ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(call) for _ in range(2)]
+        assert [future.result(timeout=5) for future in futures] == [1, 1]
+
+
+async def test_sync_cache_decorator_loop(
+    pgconn: asyncpg.Connection,
+    pgpool: asyncpg.Pool,
+) -> None:
+    channel = models.PGChannel("test_sync_cache_decorator_loop")
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn, channel)
+    strategy = strategies.Greedy(listener=listener)
+    loop = asyncio.get_running_loop()
+
+    def decorate(fn: Callable[[], float], **kwargs: Any) -> Callable[[], float]:
+        return decorators.sync_cache(strategy=strategy, **kwargs)(fn)
+
+    # Decorated outside of the event loop, the loop must be passed.
+    with pytest.raises(ValueError):
+        await asyncio.to_thread(decorate, time.monotonic)
+    cached = await asyncio.to_thread(decorate, time.monotonic, loop=loop)
+
+    first = await asyncio.to_thread(cached)
+    assert await asyncio.to_thread(cached) == first
+
+    await utils.emit_event(
+        pgpool,
+        models.Event(
+            channel=channel,
+            operation="insert",
+            sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+            table="placeholder",
+        ),
+    )
+    await asyncio.sleep(0.1)
+
+    # Drained on the loop, the event invalidates the cache of the threads.
+    assert await asyncio.to_thread(cached) != first
+
+
+async def test_cache_decorator_cancellation(pgconn: asyncpg.Connection) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(
+        pgconn,
+        models.PGChannel("test_cache_decorator_cancellation"),
+    )
+    calls = 0
+
+    @decorators.cache(strategy=strategies.Greedy(listener=listener))
+    async def slow() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return calls
+
+    # Cancelling the caller that started the computation leaves it running
+    # for the others, instead of leaving them waiting forever.
+    first = asyncio.ensure_future(slow())
+    await asyncio.sleep(0.01)
+    second = asyncio.ensure_future(slow())
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert await asyncio.wait_for(second, 1) == 1
+    assert first.cancelled()
+    assert await slow() == 1
+    assert calls == 1
+
+
+async def test_cache_decorator_timeout(pgconn: asyncpg.Connection) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn, models.PGChannel("test_cache_decorator_timeout"))
+    calls = 0
+
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        timeout=datetime.timedelta(milliseconds=50),
+    )
+    async def slow() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return calls
+
+    results = await asyncio.gather(slow(), slow(), return_exceptions=True)
+    assert all(isinstance(r, asyncio.TimeoutError) for r in results)
+
+    # The computation went on and its result is cached.
+    await asyncio.sleep(0.1)
+    assert await slow() == 1
+    assert calls == 1
+
+
+async def test_cache_decorator_negative_ttl(
+    pgconn: asyncpg.Connection,
+    pgpool: asyncpg.Pool,
+) -> None:
+    channel = models.PGChannel("test_cache_decorator_negative_ttl")
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn, channel)
+    calls = collections.Counter[str]()
+
+    @decorators.cache(
+        strategy=strategies.Greedy(listener=listener),
+        negative_ttl=datetime.timedelta(milliseconds=500),
+    )
+    async def fetch(user_id: int) -> list[int]:
+        calls.update([str(user_id)])
+        if user_id < 0:
+            raise LookupError(user_id)
+        return [user_id] if user_id else []
+
+    # Exceptions are raised again without retrying, until they expire.
+    for _ in range(3):
+        with pytest.raises(LookupError):
+            await fetch(-1)
+    assert calls["-1"] == 1
+    await asyncio.sleep(0.5)
+    with pytest.raises(LookupError):
+        await fetch(-1)
+    assert calls["-1"] == 2
+
+    # Events invalidate cached exceptions before they expire.
+    await utils.emit_event(
+        pgpool,
+        models.Event(
+            channel=channel,
+            operation="insert",
+            sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+            table="placeholder",
+        ),
+    )
+    await asyncio.sleep(0.1)
+    with pytest.raises(LookupError):
+        await fetch(-1)
+    assert calls["-1"] == 3
+    with pytest.raises(LookupError):
+        await fetch(-1)
+    assert calls["-1"] == 3
+
+    # Empty results expire as soon, others are kept.
+    for _ in range(3):
+        assert await fetch(0) == []
+        assert await fetch(1) == [1]
+    await asyncio.sleep(0.5)
+    assert await fetch(0) == []
+    assert await fetch(1) == [1]
+    assert calls["0"] == 2
+    assert calls["1"] == 1
+
+
+async def test_sync_cache_decorator_negative_ttl(pgconn: asyncpg.Connection) -> None:
+    listener = listeners.PGEventQueue()
+    await listener.connect(
+        pgconn,
+        models.PGChannel("test_sync_cache_decorator_negative_ttl"),
+    )
+    calls = 0
+
+    @decorators.sync_cache(
+        strategy=strategies.Greedy(listener=listener),
+        negative_ttl=datetime.timedelta(milliseconds=100),
+    )
+    def raise_runtime_error() -> NoReturn:
+        nonlocal calls
+        calls += 1
+        raise RuntimeError
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            await asyncio.to_thread(raise_runtime_error)
+    assert calls == 1
+
+    await asyncio.sleep(0.1)
+    with pytest.raises(RuntimeError):
+        await asyncio.to_thread(raise_runtime_error)
+    assert calls == 2
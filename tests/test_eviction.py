@@ -0,0 +1,72 @@
+import pytest
+
+from pgcachewatch import eviction
+
+
+@pytest.mark.parametrize("N", (1, 8, 64))
+def test_lru(N: int) -> None:
+    policy = eviction.LRU()
+    for key in range(N):
+        policy.insert(key)
+    assert len(policy) == N
+    assert policy.victim() == 0
+
+    policy.access(0)
+    assert policy.victim() == (1 if N > 1 else 0)
+
+    for key in range(N):
+        policy.remove(key)
+    assert len(policy) == 0
+    with pytest.raises(KeyError):
+        policy.victim()
+
+
+@pytest.mark.parametrize("N", (2, 8, 64))
+def test_lfu(N: int) -> None:
+    policy = eviction.LFU()
+    for key in range(N):
+        policy.insert(key)
+        for _ in range(key):
+            policy.access(key)
+
+    # Least frequent first, ties broken by recency.
+    for key in range(N):
+        assert policy.victim() == key
+        policy.remove(key)
+
+    with pytest.raises(KeyError):
+        policy.victim()
+
+    policy.insert("a")
+    policy.insert("b")
+    policy.access("a")
+    assert policy.victim() == "b"
+    policy.access("b")
+    assert policy.victim() == "a"
+    policy.clear()
+    assert len(policy) == 0
+
+
+def test_tiny_lfu_admission() -> None:
+    policy = eviction.TinyLFU()
+    policy.insert("popular")
+    for _ in range(16):
+        policy.access("popular")
+
+    policy.access("one-off")
+    assert not policy.admit("one-off", policy.victim())
+
+    for _ in range(32):
+        policy.access("trending")
+    assert policy.admit("trending", policy.victim())
+
+
+def test_tiny_lfu_aging() -> None:
+    policy = eviction.TinyLFU(width=64, sample_size=128)
+    for _ in range(64):
+        policy.access("old")
+    assert policy.estimate("old") >= 64
+
+    for n in range(1_024):
+        policy.access(n)
+    assert policy.estimate("old") < 64
@@ -171,3 +171,183 @@ async def test_4_uninstall_triggers(
         )
         == 0
     )
+
+
+async def test_5_row_level_triggers(
+    monkeypatch: pytest.MonkeyPatch,
+    pgconn: asyncpg.Connection,
+    pgpool: asyncpg.Pool,
+) -> None:
+    monkeypatch.setattr(
+        "sys.argv",
+        ["pgcachewatch", "install", "sysconf", "--row-level", "--commit"],
+    )
+    await cli.main()
+
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn)
+
+    try:
+        await pgpool.execute(
+            "UPDATE sysconf set value = $1 where key = 'updated_at'",
+            utcnow().isoformat(),
+        )
+        await pgpool.execute(
+            "UPDATE sysconf set key = 'app_title' where key = 'app_name'",
+        )
+        await pgpool.execute(
+            "UPDATE sysconf set key = 'app_name' where key = 'app_title'",
+        )
+
+        # Give a bit of leeway due IO network io.
+        await asyncio.sleep(0.1)
+
+        assert listener.qsize() == 3
+        assert listener.get_nowait().keys == [{"key": "updated_at"}]
+        assert listener.get_nowait().keys == [{"key": "app_title"}, {"key": "app_name"}]
+        assert listener.get_nowait().keys == [{"key": "app_name"}, {"key": "app_title"}]
+    finally:
+        monkeypatch.setattr(
+            "sys.argv",
+            ["pgcachewatch", "uninstall", "--commit"],
+        )
+        await cli.main()
+
+    # The TRUNCATE trigger is uninstalled along with the row-level one.
+    assert not await pgconn.fetch(
+        cli.queries.fetch_trigger_names(cli.cliparser().trigger_name)
+    )
+
+
+@pytest.mark.parametrize("max_keys", (1, 1_000))
+async def test_6_batched_triggers(
+    max_keys: int,
+    monkeypatch: pytest.MonkeyPatch,
+    pgconn: asyncpg.Connection,
+    pgpool: asyncpg.Pool,
+) -> None:
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "pgcachewatch",
+            "install",
+            "sysconf",
+            "--batched",
+            "--max-keys",
+            str(max_keys),
+            "--commit",
+        ],
+    )
+    await cli.main()
+
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn)
+
+    try:
+        await pgpool.execute(
+            "UPDATE sysconf set value = value where key IN ('app_name', 'app_version')"
+        )
+        await pgpool.execute("UPDATE sysconf set value = value where false")
+
+        # Give a bit of leeway due IO network io.
+        await asyncio.sleep(0.1)
+
+        # One event per statement, statements without changes are silent.
+        assert listener.qsize() == 1
+        event = listener.get_nowait()
+        assert event.operation == "update"
+        if max_keys == 1:
+            assert event.keys == []
+        else:
+            assert sorted(event.keys, key=str) == [
+                {"key": "app_name"},
+                {"key": "app_version"},
+            ]
+    finally:
+        monkeypatch.setattr(
+            "sys.argv",
+            ["pgcachewatch", "uninstall", "--commit"],
+        )
+        await cli.main()
+
+    # The TRUNCATE trigger is uninstalled along with the statement-level ones.
+    assert not await pgconn.fetch(
+        cli.queries.fetch_trigger_names(cli.cliparser().trigger_name)
+    )
+
+
+async def test_7_batched_triggers_chunking(
+    monkeypatch: pytest.MonkeyPatch,
+    pgconn: asyncpg.Connection,
+    pgpool: asyncpg.Pool,
+) -> None:
+    monkeypatch.setattr(
+        "sys.argv",
+        ["pgcachewatch", "install", "sysconf", "--batched", "--commit"],
+    )
+    await cli.main()
+
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn)
+    keys = [f"test_7_batched_triggers_chunking_{n:04}" for n in range(500)]
+
+    try:
+        await pgpool.execute(
+            "INSERT INTO sysconf (key, value) SELECT unnest($1::text[]), ''",
+            keys,
+        )
+        await pgpool.execute("DELETE FROM sysconf WHERE key = ANY($1::text[])", keys)
+
+        # Give a bit of leeway due IO network io.
+        await asyncio.sleep(0.1)
+
+        events = [listener.get_nowait() for _ in range(listener.qsize())]
+        inserts = [e for e in events if e.operation == "insert"]
+        deletes = [e for e in events if e.operation == "delete"]
+        assert len(inserts) > 1
+        assert sorted(str(k["key"]) for e in inserts for k in e.keys) == keys
+        assert sorted(str(k["key"]) for e in deletes for k in e.keys) == keys
+    finally:
+        monkeypatch.setattr(
+            "sys.argv",
+            ["pgcachewatch", "uninstall", "--commit"],
+        )
+        await cli.main()
+
+
+async def test_8_compact_triggers(
+    monkeypatch: pytest.MonkeyPatch,
+    pgconn: asyncpg.Connection,
+    pgpool: asyncpg.Pool,
+) -> None:
+    monkeypatch.setattr(
+        "sys.argv",
+        ["pgcachewatch", "install", "sysconf", "--row-level", "--compact", "--commit"],
+    )
+    await cli.main()
+
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn)
+
+    try:
+        before = utcnow()
+        await pgpool.execute(
+            "UPDATE sysconf set value = $1 where key = 'updated_at'",
+            utcnow().isoformat(),
+        )
+
+        # Give a bit of leeway due IO network io.
+        await asyncio.sleep(0.1)
+
+        assert listener.qsize() == 1
+        event = listener.get_nowait()
+        assert event.operation == "update"
+        assert event.table == "sysconf"
+        assert event.keys == [{"key": "updated_at"}]
+        assert before <= event.sent_at <= utcnow()
+    finally:
+        monkeypatch.setattr(
+            "sys.argv",
+            ["pgcachewatch", "uninstall", "--commit"],
+        )
+        await cli.main()
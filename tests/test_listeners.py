@@ -1,7 +1,7 @@
 import asyncio
 import datetime
 from subprocess import Popen
-from typing import get_args
+from typing import Any, get_args
 
 import asyncpg
 import pytest
@@ -81,3 +81,379 @@ async def test_eventqueue_and_wslistner(
             (listener.get_nowait() for _ in range(N)),
             key=lambda x: x.sent_at,
         )
+
+
+@pytest.mark.parametrize("N", (1, 8, 32))
+@pytest.mark.parametrize("subscribers", (1, 2, 16))
+async def test_event_bus_fan_out(N: int, subscribers: int) -> None:
+    channel = models.PGChannel("test_event_bus_fan_out")
+    listener = listeners.PGEventQueue()
+    bus = listeners.EventBus(listener)
+    subscriptions = [bus.subscribe() for _ in range(subscribers)]
+
+    to_emit = [
+        models.Event(
+            channel=channel,
+            operation="update",
+            sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+            table="<placeholder>",
+        )
+        for _ in range(N)
+    ]
+    for event in to_emit:
+        listener.put_nowait(event)
+
+    for subscription in subscriptions:
+        assert subscription.qsize() == N
+        assert [subscription.get_nowait() for _ in range(N)] == to_emit
+        with pytest.raises(asyncio.QueueEmpty):
+            subscription.get_nowait()
+
+    assert listener.qsize() == 0
+
+
+@pytest.mark.parametrize("max_size", (1, 4, 16))
+async def test_event_bus_slow_subscriber(max_size: int) -> None:
+    channel = models.PGChannel("test_event_bus_slow_subscriber")
+    listener = listeners.PGEventQueue()
+    bus = listeners.EventBus(listener, max_size=max_size)
+    fast, slow = bus.subscribe(), bus.subscribe()
+
+    for _ in range(max_size * 2):
+        listener.put_nowait(
+            models.Event(
+                channel=channel,
+                operation="insert",
+                sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+                table="<placeholder>",
+            )
+        )
+        assert fast.get_nowait().operation == "insert"
+
+    assert slow.qsize() == max_size
+    assert slow.get_nowait().operation == "invalidate"
+    assert slow.missed == max_size
+    assert [slow.get_nowait().operation for _ in range(max_size)] == [
+        "insert"
+    ] * max_size
+
+    with pytest.raises(asyncio.QueueEmpty):
+        slow.get_nowait()
+
+
+@pytest.mark.parametrize("operation", get_args(models.OPERATIONS))
+@pytest.mark.parametrize("payload_type", (str, bytes))
+async def test_parse_event(
+    operation: models.OPERATIONS,
+    payload_type: type,
+) -> None:
+    channel = models.PGChannel("test_parse_event")
+    event = models.Event(
+        channel=channel,
+        operation=operation,
+        sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+        table="<placeholder>",
+    )
+    dumped = event.model_dump_json(exclude={"channel", "received_at"})
+    payload = dumped.encode() if payload_type is bytes else dumped
+
+    parsed = listeners.parse_event(channel, payload, event.received_at)
+    assert parsed == event
+
+    queue = asyncio.Queue[models.Event]()
+    listeners.create_event_inserter(queue, datetime.timedelta(days=1))(
+        channel,
+        payload,
+    )
+    assert queue.get_nowait().sent_at == event.sent_at
+
+
+async def test_parse_event_invalid() -> None:
+    channel = models.PGChannel("test_parse_event_invalid")
+    with pytest.raises(ValueError):
+        listeners.parse_event(channel, '{"operation": "upsert", "table": "x"}')
+
+    queue = asyncio.Queue[models.Event]()
+    listeners.create_event_inserter(queue, datetime.timedelta(days=1))(
+        channel,
+        "not json",
+    )
+    assert queue.empty()
+
+
+@pytest.mark.parametrize("N", (1, 8, 32))
+async def test_coalescing_event_inserter(N: int) -> None:
+    channel = models.PGChannel("test_coalescing_event_inserter")
+    queue = asyncio.Queue[models.Event]()
+    coalescer = listeners.EventCoalescer(datetime.timedelta(seconds=1))
+    inserter = listeners.create_event_inserter(
+        queue,
+        datetime.timedelta(days=1),
+        coalescer,
+    )
+
+    def payload(table: str) -> str:
+        return models.Event(
+            channel=channel,
+            operation="update",
+            sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+            table=table,
+        ).model_dump_json(exclude={"channel", "received_at"})
+
+    for _ in range(N):
+        inserter(channel, payload("a"))
+        inserter(channel, payload("b"))
+
+    # One pending event per distinct change.
+    assert queue.qsize() == 2
+    assert coalescer.coalesced == 2 * (N - 1)
+
+    # Once consumed, the same change is queued again.
+    coalescer.consumed(queue.get_nowait())
+    inserter(channel, payload("a"))
+    inserter(channel, payload("b"))
+    assert [queue.get_nowait().table for _ in range(queue.qsize())] == ["b", "a"]
+
+
+async def test_coalescing_event_queue() -> None:
+    channel = models.PGChannel("test_coalescing_event_queue")
+    listener = listeners.PGEventQueue(coalesce_window=datetime.timedelta(seconds=1))
+    event = models.Event(
+        channel=channel,
+        operation="update",
+        sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+        table="<placeholder>",
+    )
+    assert listener._coalescer is not None
+    assert listener._coalescer.admit(event)
+    listener.put_nowait(event)
+    assert not listener._coalescer.admit(event)
+
+    # Taking the event out of the queue releases it.
+    assert listener.get_nowait() is event
+    assert listener._coalescer.admit(event)
+
+
+async def test_event_queue_wait() -> None:
+    listener = listeners.EventQueue()
+    waiter = asyncio.create_task(listener.wait())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    listener.put_nowait(
+        models.Event(
+            channel=models.PGChannel("test_event_queue_wait"),
+            operation="insert",
+            sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+            table="<placeholder>",
+        )
+    )
+    await asyncio.wait_for(waiter, timeout=1)
+
+    # Returns immediately while events are queued.
+    await asyncio.wait_for(listener.wait(), timeout=1)
+
+
+async def test_pglistner_reconnect(pgpool: asyncpg.Pool) -> None:
+    channel = models.PGChannel("test_pglistner_reconnect")
+    listener = listeners.PGEventQueue()
+    await listener.connect_forever(
+        asyncpg.connect,
+        channel,
+        min_backoff=datetime.timedelta(milliseconds=10),
+    )
+    assert listener.connection_healthy()
+
+    try:
+        assert listener._pg_connection is not None
+        pid = listener._pg_connection.get_server_pid()
+        await pgpool.execute("SELECT pg_terminate_backend($1)", pid)
+        await asyncio.sleep(0.5)
+
+        # Reconnected, with a synthetic event covering the gap.
+        assert listener.connection_healthy()
+        assert listener.get_nowait().operation == "invalidate"
+
+        event = models.Event(
+            channel=channel,
+            operation="insert",
+            sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+            table="<placeholder>",
+        )
+        await utils.emit_event(pgpool, event)
+        await asyncio.sleep(0.1)
+        assert listener.get_nowait() == event
+    finally:
+        await listener.close()
+
+
+async def test_pglistner_reconnect_failed_listen(pgpool: asyncpg.Pool) -> None:
+    channel = models.PGChannel("test_pglistner_reconnect_failed_listen")
+    listener = listeners.PGEventQueue()
+    connections = list[asyncpg.Connection]()
+
+    class FailingConnection(asyncpg.Connection):
+        async def add_listener(self, *args: Any) -> None:
+            raise OSError("can not listen")
+
+    async def connector() -> asyncpg.Connection:
+        # The first connection fails to listen, the second one succeeds.
+        connection_class = asyncpg.Connection if connections else FailingConnection
+        connection = await asyncpg.connect(connection_class=connection_class)
+        connections.append(connection)
+        return connection
+
+    await listener.connect_forever(
+        connector,
+        channel,
+        min_backoff=datetime.timedelta(milliseconds=10),
+    )
+    try:
+        assert connections[0].is_closed()
+        assert listener._pg_connection is connections[1]
+        assert listener.connection_healthy()
+
+        event = models.Event(
+            channel=channel,
+            operation="insert",
+            sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+            table="<placeholder>",
+        )
+        await utils.emit_event(pgpool, event)
+        await asyncio.sleep(0.1)
+        assert listener.get_nowait() == event
+    finally:
+        await listener.close()
+
+
+@pytest.mark.parametrize("N", (1, 8, 32))
+@pytest.mark.parametrize("channels", (1, 2, 16))
+async def test_channel_multiplexer(
+    N: int,
+    channels: int,
+    pgconn: asyncpg.Connection,
+    pgpool: asyncpg.Pool,
+) -> None:
+    multiplexer = listeners.PGChannelMultiplexer()
+    await multiplexer.connect(pgconn)
+    names = [
+        models.PGChannel(f"test_channel_multiplexer_{N}_{channels}_{i}")
+        for i in range(channels)
+    ]
+    subscriptions = {name: await multiplexer.subscribe(name) for name in names}
+    assert multiplexer.channels == set(names)
+
+    to_emit = {
+        name: [
+            models.Event(
+                channel=name,
+                operation="insert",
+                sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+                table="<placeholder>",
+            )
+            for _ in range(N)
+        ]
+        for name in names
+    }
+    for events in to_emit.values():
+        for event in events:
+            await utils.emit_event(pgpool, event)
+    await asyncio.sleep(0.1)
+
+    # Every subscription only sees the events of its own channel.
+    for name, subscription in subscriptions.items():
+        assert [subscription.get_nowait() for _ in range(N)] == to_emit[name]
+        assert subscription.qsize() == 0
+
+    await multiplexer.remove_channel(names[0])
+    assert not subscriptions[names[0]].connection_healthy()
+    assert all(subscriptions[name].connection_healthy() for name in names[1:])
+
+
+@pytest.mark.parametrize("N", (1, 8, 32))
+async def test_parse_events_batch(N: int) -> None:
+    channel = models.PGChannel("test_parse_events_batch")
+    events = [
+        models.Event(
+            channel=channel,
+            operation="insert",
+            sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+            table=f"table_{n}",
+        )
+        for n in range(N)
+    ]
+    payload = "[%s]" % ",".join(
+        e.model_dump_json(exclude={"channel", "received_at"}) for e in events
+    )
+
+    received_at = datetime.datetime.now(tz=datetime.timezone.utc)
+    parsed = listeners.parse_events(channel, payload, received_at)
+    assert [e.table for e in parsed] == [e.table for e in events]
+    assert all(e.received_at == received_at for e in parsed)
+
+    queue = asyncio.Queue[models.Event]()
+    listeners.create_event_inserter(queue, datetime.timedelta(days=1))(
+        channel,
+        payload,
+    )
+    assert [queue.get_nowait().table for _ in range(N)] == [e.table for e in events]
+
+
+async def test_parse_events_batch_invalid() -> None:
+    channel = models.PGChannel("test_parse_events_batch_invalid")
+    valid = models.Event(
+        channel=channel,
+        operation="insert",
+        sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+        table="valid",
+    ).model_dump_json(exclude={"channel", "received_at"})
+    payload = f'[{valid}, {{"operation": "upsert", "table": "x"}}, "not an event"]'
+
+    # Invalid events only drop themselves.
+    parsed = listeners.parse_events(channel, payload)
+    assert [e.table for e in parsed] == ["valid"]
+
+    queue = asyncio.Queue[models.Event]()
+    listeners.create_event_inserter(queue, datetime.timedelta(days=1))(
+        channel,
+        payload,
+    )
+    assert queue.qsize() == 1
+
+
+@pytest.mark.parametrize(
+    "payload, sequence",
+    (
+        ('{"seq":7,"keys":[{"seq":5}]}', 7),
+        ('[{"seq":7,"keys":[]},{"seq":8,"keys":[{"seq":5}]}]', 8),
+        ('[{"seq":7},"not an event"]', 7),
+        ('{"keys":[{"seq":5}]}', None),
+        ("not json", None),
+    ),
+)
+def test_last_sequence(payload: str, sequence: int | None) -> None:
+    # A key column named seq is not mistaken for the stamped sequence number.
+    assert listeners._last_sequence(payload) == sequence
+    assert listeners._last_sequence(payload.encode()) == sequence
+
+
+@pytest.mark.parametrize("operation", ("insert", "update", "delete", "truncate"))
+async def test_parse_compact_event(operation: models.OPERATIONS) -> None:
+    channel = models.PGChannel("test_parse_compact_event")
+    sent_at = datetime.datetime.now(tz=datetime.timezone.utc)
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    micros = (sent_at - epoch) // datetime.timedelta(microseconds=1)
+    payload = '{"o": "%s", "t": "sysconf", "s": %d, "k": [{"key": "app_name"}]}' % (
+        operation[0],
+        micros,
+    )
+
+    received_at = datetime.datetime.now(tz=datetime.timezone.utc)
+    assert listeners.parse_event(channel, payload, received_at) == models.Event(
+        channel=channel,
+        operation=operation,
+        sent_at=sent_at,
+        table="sysconf",
+        keys=[{"key": "app_name"}],
+        received_at=received_at,
+    )
@@ -1,19 +1,42 @@
 import asyncio
+import collections
+import json
+from contextlib import suppress
 from datetime import datetime, timezone
-from subprocess import Popen
+from subprocess import PIPE, Popen
 from typing import get_args
 
 import asyncpg
+import httpx
 import pytest
 import websockets
 from conftest import pg_event_distributor_isup, pgb_address
-from pgcachewatch import listeners, models, utils
+from pgcachewatch import listeners, models, pg_event_distributor, utils
 
 
 async def test_up_endpoint(pgedapp: Popen) -> None:
     assert await pg_event_distributor_isup()
 
 
+async def test_metrics_endpoint(
+    pgedapp: Popen,
+    channel: models.PGChannel = models.PGChannel("test_metrics_endpoint"),
+) -> None:
+    async with websockets.connect(f"ws://{pgb_address()}/pgpubsub/{channel}"):
+        await asyncio.sleep(0.1)
+        async with httpx.AsyncClient(base_url=f"http://{pgb_address()}") as client:
+            response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.json()[channel] == {
+        "subscribers": 1,
+        "dropped": 0,
+        "coalesced": 0,
+        "disconnected": 0,
+        "resumed": 0,
+        "invalidated": 0,
+    }
+
+
 @pytest.mark.parametrize("operation", get_args(models.OPERATIONS))
 @pytest.mark.parametrize("N", (1, 8))
 async def test_ws_broadcast(
@@ -43,6 +66,29 @@ async def test_ws_broadcast(
         assert to_emit == sorted(received, key=lambda x: x.sent_at)
 
 
+@pytest.mark.parametrize("binary", (False, True))
+async def test_ws_broadcast_frames(
+    pgedapp: Popen,
+    binary: bool,
+    pgpool: asyncpg.Pool,
+    channel: models.PGChannel = models.PGChannel("test_ws_broadcast_frames"),
+) -> None:
+    url = f"ws://{pgb_address()}/pgpubsub/{channel}?binary={str(binary).lower()}"
+    async with websockets.connect(url) as ws:
+        event = models.Event(
+            channel=channel,
+            operation="insert",
+            sent_at=datetime.now(tz=timezone.utc),
+            table="<placeholder>",
+        )
+        await utils.emit_event(pgpool, event)
+
+        # Text frames unless binary ones are asked for.
+        frame = await ws.recv()
+        assert isinstance(frame, bytes if binary else str)
+        assert models.Event.model_validate_json(frame) == event
+
+
 @pytest.mark.parametrize("operation", get_args(models.OPERATIONS))
 @pytest.mark.parametrize("N", (1, 8, 16))
 async def test_put_ws_event_queue(
@@ -144,3 +190,224 @@ async def test_ws_event_queue_connection_healthy(
         assert lisn.connection_healthy()
 
     assert not lisn.connection_healthy()
+
+
+@pytest.mark.parametrize("subscribers", (1, 2, 16))
+async def test_broadcaster(
+    subscribers: int,
+    pgconn: asyncpg.Connection,
+    pgpool: asyncpg.Pool,
+    channel: models.PGChannel = models.PGChannel("test_broadcaster"),
+) -> None:
+    broadcaster = pg_event_distributor.Broadcaster(pgconn)
+    subs = [await broadcaster.subscribe(channel) for _ in range(subscribers)]
+    assert broadcaster.subscribers(channel) == subscribers
+
+    event = models.Event(
+        channel=channel,
+        operation="insert",
+        sent_at=datetime.now(tz=timezone.utc),
+        table="<placeholder>",
+    )
+    await utils.emit_event(pgpool, event)
+    await asyncio.sleep(0.1)
+
+    # The frame is encoded once and shared by all subscribers.
+    frames = [subscriber.get_nowait() for subscriber in subs]
+    assert all(frame is frames[0] for frame in frames)
+    assert models.Event.model_validate_json(frames[0]) == event
+
+    for subscriber in subs:
+        await broadcaster.unsubscribe(channel, subscriber)
+    assert broadcaster.subscribers(channel) == 0
+
+
+async def test_broadcaster_frames(
+    pgconn: asyncpg.Connection,
+    pgpool: asyncpg.Pool,
+    channel: models.PGChannel = models.PGChannel("test_broadcaster_frames"),
+) -> None:
+    broadcaster = pg_event_distributor.Broadcaster(pgconn)
+    subscriber = await broadcaster.subscribe(channel)
+
+    payloads = ["{}", "{ }", '{"a": 1}', "not json", "[1]"]
+    for payload in payloads:
+        await pgpool.execute("SELECT pg_notify($1, $2)", channel, payload)
+    await asyncio.sleep(0.1)
+
+    # JSON objects are stamped with their sequence number, others sent as is.
+    frames = [subscriber.get_nowait() for _ in payloads]
+    assert [json.loads(frame) for frame in frames[:3]] == [
+        {"seq": listeners._last_sequence(frame)} | json.loads(payload)
+        for frame, payload in zip(frames[:3], payloads)
+    ]
+    assert frames[3:] == [b"not json", b"[1]"]
+    await broadcaster.unsubscribe(channel, subscriber)
+
+
+@pytest.mark.parametrize("N", (1, 8))
+async def test_broadcaster_resume(
+    N: int,
+    pgconn: asyncpg.Connection,
+    pgpool: asyncpg.Pool,
+    channel: models.PGChannel = models.PGChannel("test_broadcaster_resume"),
+) -> None:
+    broadcaster = pg_event_distributor.Broadcaster(pgconn, replay_size=N)
+    subscriber = await broadcaster.subscribe(channel)
+
+    def event() -> models.Event:
+        return models.Event(
+            channel=channel,
+            operation="insert",
+            sent_at=datetime.now(tz=timezone.utc),
+            table="<placeholder>",
+        )
+
+    for _ in range(N):
+        await utils.emit_event(pgpool, event())
+    await asyncio.sleep(0.1)
+
+    frames = [subscriber.get_nowait() for _ in range(N)]
+    sequences = [
+        sequence
+        for frame in frames
+        if (sequence := listeners._last_sequence(frame)) is not None
+    ]
+    assert len(sequences) == N
+    assert sequences == sorted(sequences)
+
+    # Everything after the last received frame is replayed.
+    resumed = await broadcaster.subscribe(channel, after=sequences[0] - 1)
+    assert [resumed.get_nowait() for _ in range(N)] == frames
+
+    # Once a missed frame is evicted, the client is told to invalidate.
+    await utils.emit_event(pgpool, event())
+    await asyncio.sleep(0.1)
+    for after in (sequences[0] - 1, 0):
+        invalidated = await broadcaster.subscribe(channel, after=after)
+        frame = invalidated.get_nowait()
+        assert models.Event.model_validate_json(frame).operation == "invalidate"
+
+    assert broadcaster.report()[channel]["resumed"] == 1
+    assert broadcaster.report()[channel]["invalidated"] == 2
+
+
+@pytest.mark.parametrize("max_buffer", (1, 4, 16))
+@pytest.mark.parametrize("overflow", get_args(pg_event_distributor.Overflow))
+async def test_subscriber_overflow(
+    max_buffer: int,
+    overflow: pg_event_distributor.Overflow,
+) -> None:
+    metrics = collections.Counter[str]()
+    subscriber = pg_event_distributor.Subscriber(
+        "test_subscriber_overflow",
+        max_buffer,
+        overflow,
+        metrics,
+    )
+    frames = [str(n).encode() for n in range(max_buffer + 1)]
+    for frame in frames:
+        subscriber.offer(frame)
+
+    if overflow == "drop-oldest":
+        assert [await subscriber.get() for _ in range(max_buffer)] == frames[1:]
+        assert metrics == {"dropped": 1}
+    elif overflow == "invalidate":
+        marker = await subscriber.get()
+        assert marker is not None
+        assert models.Event.model_validate_json(marker).operation == "invalidate"
+        assert await subscriber.get() == frames[-1]
+        assert metrics == {"coalesced": max_buffer}
+    else:
+        assert await subscriber.get() is None
+        assert metrics == {"disconnected": 1}
+
+
+async def test_subscriber_batch() -> None:
+    subscriber = pg_event_distributor.Subscriber(
+        "test_subscriber_batch",
+        16,
+        "drop-oldest",
+        collections.Counter[str](),
+    )
+    frames = [b'{"n":0}', b'{"n":1}', pg_event_distributor._Opaque(b"raw"), b"{}"]
+    for frame in frames[1:]:
+        subscriber.offer(frame)
+
+    # Frames that are not JSON objects are never spliced into a batch.
+    assert subscriber.batch(frames[0]) == b'[{"n":0},{"n":1}]'
+    assert subscriber.batch(subscriber.get_nowait()) == b"raw"
+    assert subscriber.batch(subscriber.get_nowait()) == b"[{}]"
+
+
+@pytest.mark.parametrize("N", (1, 64))
+async def test_batched_ws_event_queue(
+    pgedapp: Popen,
+    N: int,
+    pgpool: asyncpg.Pool,
+    channel: models.PGChannel = models.PGChannel("test_batched_ws_event_queue"),
+) -> None:
+    async with websockets.connect(
+        f"ws://{pgb_address()}/pgpubsub/{channel}?linger_ms=50"
+    ) as ws:
+        lisn = listeners.WSEventQueue()
+        await lisn.connect(ws, channel)
+
+        to_emit = [
+            models.Event(
+                channel=models.PGChannel(channel),
+                operation="insert",
+                sent_at=datetime.now(tz=timezone.utc),
+                table="<placeholder>",
+            )
+            for _ in range(N)
+        ]
+        await asyncio.gather(*[utils.emit_event(pgpool, e) for e in to_emit])
+
+        # Give a bit of leeway due IO network io and the linger window.
+        await asyncio.sleep(0.2)
+
+        assert lisn.qsize() == N
+        assert to_emit == sorted(
+            (lisn.get_nowait() for _ in range(N)),
+            key=lambda x: x.sent_at,
+        )
+
+
+@pytest.mark.parametrize("N", (1, 8))
+async def test_multi_process_distributor(
+    N: int,
+    pgpool: asyncpg.Pool,
+    channel: models.PGChannel = models.PGChannel("test_multi_process_distributor"),
+) -> None:
+    address = "127.0.0.1:8001"
+    command = "python -m pgcachewatch.pg_event_distributor --workers 2 --port 8001"
+    with Popen(command.split(), stderr=PIPE, stdout=PIPE) as p:
+        try:
+            async with httpx.AsyncClient(base_url=f"http://{address}") as client:
+                for _ in range(1_000):
+                    with suppress(httpx.ConnectError):
+                        if (await client.get("/up")).is_success:
+                            break
+                    await asyncio.sleep(0.01)
+
+            # Connections are spread over both workers by the kernel.
+            url = f"ws://{address}/pgpubsub/{channel}"
+            sockets = [await websockets.connect(url) for _ in range(N)]
+            await asyncio.sleep(0.1)
+
+            event = models.Event(
+                channel=channel,
+                operation="insert",
+                sent_at=datetime.now(tz=timezone.utc),
+                table="<placeholder>",
+            )
+            await utils.emit_event(pgpool, event)
+
+            for ws in sockets:
+                received = await asyncio.wait_for(ws.recv(), 1)
+                assert models.Event.model_validate_json(received) == event
+                await ws.close()
+        finally:
+            p.terminate()
+            p.wait()
@@ -0,0 +1,79 @@
+import asyncio
+import datetime
+from pathlib import Path
+
+import pytest
+from pgcachewatch import listeners, models, relay
+
+
+class HealthyEventQueue(listeners.EventQueue):
+    def __init__(self) -> None:
+        super().__init__()
+        self.healthy = True
+
+    def connection_healthy(self) -> bool:
+        return self.healthy
+
+
+def make_event(channel: models.PGChannel) -> models.Event:
+    return models.Event(
+        channel=channel,
+        operation="insert",
+        sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+        table="<placeholder>",
+    )
+
+
+@pytest.mark.parametrize("N", (1, 8, 32))
+@pytest.mark.parametrize("workers", (1, 4))
+async def test_unix_event_relay(N: int, workers: int, tmp_path: Path) -> None:
+    channel = models.PGChannel("test_unix_event_relay")
+    path = str(tmp_path / "relay.sock")
+    source = HealthyEventQueue()
+
+    async with relay.UnixEventRelay(source, path) as server:
+        consumers = [listeners.UnixEventQueue() for _ in range(workers)]
+        for consumer in consumers:
+            await consumer.connect(path, channel)
+        await asyncio.sleep(0.01)
+        assert server.clients == workers
+
+        to_emit = [make_event(channel) for _ in range(N)]
+        for event in to_emit:
+            source.put_nowait(event)
+        await asyncio.sleep(0.1)
+
+        for consumer in consumers:
+            assert consumer.connection_healthy()
+            # Receivers stamp their own arrival time.
+            received = [consumer.get_nowait() for _ in range(N)]
+            assert [e.model_dump(exclude={"received_at"}) for e in received] == [
+                e.model_dump(exclude={"received_at"}) for e in to_emit
+            ]
+            await consumer.close()
+
+
+async def test_unix_event_relay_reconnect(tmp_path: Path) -> None:
+    channel = models.PGChannel("test_unix_event_relay_reconnect")
+    path = str(tmp_path / "relay.sock")
+    source = HealthyEventQueue()
+    consumer = listeners.UnixEventQueue()
+
+    async with relay.UnixEventRelay(source, path):
+        await consumer.connect(
+            path, channel, min_backoff=datetime.timedelta(milliseconds=10)
+        )
+        await asyncio.sleep(0.01)
+
+        # Clients are dropped while the source is unhealthy.
+        source.healthy = False
+        source.put_nowait(make_event(channel))
+        await asyncio.sleep(0.1)
+        assert not consumer.connection_healthy()
+
+    source.healthy = True
+    async with relay.UnixEventRelay(source, path):
+        await asyncio.sleep(0.1)
+        assert consumer.connection_healthy()
+        assert consumer.get_nowait().operation == "invalidate"
+        await consumer.close()
@@ -0,0 +1,58 @@
+import pickle
+
+import asyncpg
+import pytest
+from pgcachewatch import serialization
+
+
+@pytest.mark.parametrize(
+    "value",
+    (None, 1, "a", [1, "a", None], {"a": (1, 2)}, bytearray(b"x" * 1_024)),
+)
+@pytest.mark.parametrize(
+    "codec",
+    (serialization.PickleCodec(), serialization.RecordCodec()),
+)
+def test_pickle_codec(codec: serialization.Codec, value: object) -> None:
+    assert codec.loads(codec.dumps(value)) == value
+    assert codec.loads(memoryview(codec.dumps(value))) == value
+
+
+def test_pickle_codec_out_of_band() -> None:
+    codec = serialization.PickleCodec()
+    payload = b"x" * 1_024
+    data = memoryview(codec.dumps(pickle.PickleBuffer(payload)))
+
+    # Out of band buffers are decoded as views of the encoded data.
+    decoded = codec.loads(data)
+    assert isinstance(decoded, memoryview)
+    assert decoded.obj is data.obj
+    assert decoded == payload
+
+
+async def test_record_codec(pgconn: asyncpg.Connection) -> None:
+    codec = serialization.RecordCodec()
+    records = await pgconn.fetch(
+        "SELECT n AS id, 'v' || n AS label FROM generate_series(1, 100) AS n"
+    )
+    rows = codec.loads(codec.dumps(records))
+
+    assert len(rows) == len(records)
+    for row, record in zip(rows, records):
+        assert row["id"] == record["id"]
+        assert row[1] == record[1]
+        assert row.get("label") == record.get("label")
+        assert row.get("missing") is None
+        assert list(row.keys()) == list(record.keys())
+        assert list(row.values()) == list(record.values())
+        assert list(row.items()) == list(record.items())
+
+    # Column names are stored once, not once per record.
+    assert codec.dumps(records).count(b"label") == 1
+
+
+def test_msgpack_codec() -> None:
+    pytest.importorskip("msgpack")
+    codec = serialization.MsgpackCodec()
+    value = {"a": [1, "a", None, b"x"], 1: True}
+    assert codec.loads(codec.dumps(value)) == value
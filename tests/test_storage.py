@@ -0,0 +1,103 @@
+import functools
+import multiprocessing
+from pathlib import Path
+from typing import Callable, Hashable
+
+import pytest
+from pgcachewatch import storage
+
+
+def shared(path: Path) -> Callable[[], storage.Storage]:
+    return functools.partial(storage.SharedMemoryStorage, "test", str(path))
+
+
+@pytest.fixture(params=("memory", "shared"))
+def store(request: pytest.FixtureRequest, tmp_path: Path) -> storage.Storage:
+    if request.param == "memory":
+        return storage.MemoryStorage()
+    return shared(tmp_path)()
+
+
+@pytest.mark.parametrize(
+    "key", (1, "a", (1, "a"), functools._make_key((1,), {}, False))
+)
+def test_storage(store: storage.Storage, key: Hashable) -> None:
+    with pytest.raises(KeyError):
+        store.get(key)
+
+    store.set(key, b"first")
+    assert bytes(store.get(key)) == b"first"
+
+    store.set(key, b"second")
+    assert bytes(store.get(key)) == b"second"
+
+    store.delete(key)
+    store.delete(key)
+    with pytest.raises(KeyError):
+        store.get(key)
+
+
+@pytest.mark.parametrize("N", (1, 8, 32))
+def test_storage_clear(store: storage.Storage, N: int) -> None:
+    for key in range(N):
+        store.set(key, bytes([key]))
+    assert [bytes(store.get(key)) for key in range(N)] == [
+        bytes([key]) for key in range(N)
+    ]
+
+    store.clear()
+    for key in range(N):
+        with pytest.raises(KeyError):
+            store.get(key)
+
+
+def test_storage_stale_generation(store: storage.Storage) -> None:
+    # Computed before a clear, the value is dropped rather than stored.
+    generation = store.generation()
+    store.clear()
+    store.set(1, b"stale", generation)
+    with pytest.raises(KeyError):
+        store.get(1)
+
+    store.set(1, b"fresh", store.generation())
+    assert bytes(store.get(1)) == b"fresh"
+
+
+def _set_in_child(path: Path) -> None:
+    shared(path)().set(functools._make_key(("orders",), {}, False), b"orders")
+
+
+def test_shared_memory_storage_across_processes(tmp_path: Path) -> None:
+    # Spawned processes hash strings with another seed.
+    process = multiprocessing.get_context("spawn").Process(
+        target=_set_in_child,
+        args=(tmp_path,),
+    )
+    process.start()
+    process.join()
+
+    store = shared(tmp_path)()
+    assert bytes(store.get(functools._make_key(("orders",), {}, False))) == b"orders"
+
+    other = shared(tmp_path)()
+    other.clear()
+    with pytest.raises(KeyError):
+        store.get(functools._make_key(("orders",), {}, False))
+    assert [p.name for p in tmp_path.iterdir()] == ["pgcachewatch-test"]
+    assert [p.name for p in (tmp_path / "pgcachewatch-test").iterdir()] == [
+        "generation"
+    ]
+
+
+def test_shared_memory_storage_cleared_by_other_process(tmp_path: Path) -> None:
+    store = shared(tmp_path)()
+    generation = store.generation()
+
+    # Another process clears while this one computes a value.
+    shared(tmp_path)().clear()
+    store.set(1, b"stale", generation)
+    with pytest.raises(KeyError):
+        store.get(1)
+    assert [p.name for p in (tmp_path / "pgcachewatch-test").iterdir()] == [
+        "generation"
+    ]
@@ -147,3 +147,55 @@ async def test_timed_strategy(
     # No evnets, no clear.
     for _ in range(N):
         assert not strategy.clear()
+
+
+@pytest.mark.parametrize("N", (4, 16, 64))
+async def test_targeted_strategy(N: int, pgconn: asyncpg.Connection) -> None:
+    channel = models.PGChannel("test_targeted_strategy")
+    listener = listeners.PGEventQueue()
+    await listener.connect(pgconn, channel)
+    strategy = strategies.Targeted(listener=listener)
+
+    for n in range(N):
+        await listener.put(
+            models.Event(
+                channel=channel,
+                operation="update",
+                sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+                table=f"table_{n % 2}",
+            )
+        )
+    assert not strategy.clear()
+    assert strategy.affected() == {("table_0",), ("table_1",)}
+    assert strategy.affected() == set()
+
+    await listener.put(
+        models.Event(
+            channel=channel,
+            operation="invalidate",
+            sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+            table="",
+        )
+    )
+    assert strategy.clear()
+    assert strategy.affected() == set()
+
+
+@pytest.mark.parametrize(
+    "keys, expected",
+    (
+        ([], {("placeholder",)}),
+        ([{"id": 1}], {("placeholder", 1)}),
+        ([{"id": 1}, {"id": 2}], {("placeholder", 1), ("placeholder", 2)}),
+        ([{"a": 1, "b": "x"}], {("placeholder", 1, "x")}),
+    ),
+)
+def test_event_tags(keys: list[models.Key], expected: set[strategies.Tag]) -> None:
+    event = models.Event(
+        channel=models.PGChannel("test_event_tags"),
+        operation="update",
+        sent_at=datetime.datetime.now(tz=datetime.timezone.utc),
+        table="placeholder",
+        keys=keys,
+    )
+    assert set(strategies.event_tags(event) or ()) == expected